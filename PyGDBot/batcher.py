@@ -0,0 +1,85 @@
+import time
+import asyncio
+import logging
+
+from typing import Any, Awaitable, Callable
+
+
+class MediaBatcher:
+    """Packs media into as few Telegram albums as possible.
+
+    An album holds at most ``max_items`` photos and videos and ``max_bytes`` of
+    uploads. A pending album is sent as soon as it is full, when the next media
+    would not fit, or once its first media has waited ``max_delay`` seconds, so
+    a slow download does not hold back media that are already there.
+    """
+
+    def __init__(
+        self,
+        send: Callable[[list, list], Awaitable[Any]],
+        max_items: int = 10,
+        max_bytes: int = 50 * 1024 * 1024,
+        max_delay: float = 5.0
+    ) -> None:
+        self.__send = send
+        self.__max_items = max_items
+        self.__max_bytes = max_bytes
+        self.__max_delay = max_delay
+        self.__media = []
+        self.__filenames = []
+        self.__bytes = 0
+        self.__timer = None
+        self.__lock = asyncio.Lock()
+        self.__logger = logging.getLogger(self.__class__.__name__)
+
+    async def add(self, media: Any, filename: str, size: int = 0) -> None:
+        async with self.__lock:
+            if self.__media and self.__bytes + size > self.__max_bytes:
+                await self.__flush()
+
+            self.__media.append(media)
+            self.__filenames.append(filename)
+            self.__bytes += size
+
+            if len(self.__media) >= self.__max_items:
+                await self.__flush()
+            elif self.__timer is None:
+                self.__timer = asyncio.create_task(self.__flush_later())
+
+    async def flush(self) -> None:
+        async with self.__lock:
+            await self.__flush()
+
+    def cancel(self) -> list:
+        """Drop the pending album without sending it, and return its media."""
+        if self.__timer is not None:
+            self.__timer.cancel()
+        self.__timer = None
+
+        media = self.__media
+        self.__media, self.__filenames, self.__bytes = [], [], 0
+        return media
+
+    async def __flush_later(self) -> None:
+        await asyncio.sleep(self.__max_delay)
+        async with self.__lock:
+            self.__timer = None
+            await self.__flush()
+
+    async def __flush(self) -> None:
+        if self.__timer is not None and self.__timer is not asyncio.current_task():
+            self.__timer.cancel()
+        self.__timer = None
+
+        if not self.__media: return
+
+        media, filenames = self.__media, self.__filenames
+        self.__media, self.__filenames, self.__bytes = [], [], 0
+
+        started = time.monotonic()
+        try:
+            await self.__send(media, filenames)
+        except Exception as e:
+            self.__logger.error(f"Failed to send an album of {len(media)} media : {e}")
+        else:
+            self.__logger.info(f"Sent an album of {len(media)} media in {time.monotonic() - started:.2f}s.")
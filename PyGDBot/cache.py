@@ -0,0 +1,267 @@
+import io
+import os
+import time
+import asyncio
+import shutil
+import sqlite3
+import uuid
+import hashlib
+import threading
+
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable
+from PyGDBot.http_client import ReusableMedia
+
+
+def cache_key(asset_id: str) -> str:
+    return hashlib.sha256(asset_id.encode("utf-8")).hexdigest()
+
+
+class FileIdCache:
+    """Maps an Instagram media asset to the Telegram ``file_id`` it was uploaded as.
+
+    Entries are kept in memory, bounded to ``max_size`` with LRU eviction, and
+    written through to SQLite when ``path`` is given so they survive restarts.
+    """
+
+    def __init__(self, path: str | None = None, max_size: int = 100000) -> None:
+        self.__max_size = max_size
+        self.__entries = OrderedDict()
+        self.__conn = None
+
+        if path:
+            self.__conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+            self.__conn.execute("PRAGMA journal_mode=WAL")
+            self.__conn.execute(
+                "CREATE TABLE IF NOT EXISTS file_ids ("
+                "key TEXT PRIMARY KEY, file_id TEXT NOT NULL, content_type TEXT NOT NULL)"
+            )
+
+    def get(self, asset_id: str) -> tuple[str, str] | None:
+        key = cache_key(asset_id)
+
+        entry = self.__entries.get(key)
+        if entry is None and self.__conn is not None:
+            entry = self.__conn.execute(
+                "SELECT file_id, content_type FROM file_ids WHERE key = ?", (key,)
+            ).fetchone()
+            if entry is not None:
+                entry = tuple(entry)
+                self.__remember(key, entry)
+
+        if entry is not None:
+            self.__entries.move_to_end(key)
+        return entry
+
+    def put(self, asset_id: str, file_id: str, content_type: str) -> None:
+        key = cache_key(asset_id)
+        self.__remember(key, (file_id, content_type))
+
+        if self.__conn is not None:
+            self.__conn.execute(
+                "INSERT OR REPLACE INTO file_ids (key, file_id, content_type) VALUES (?, ?, ?)",
+                (key, file_id, content_type)
+            )
+
+    def __remember(self, key: str, entry: tuple[str, str]) -> None:
+        self.__entries[key] = entry
+        self.__entries.move_to_end(key)
+
+        while len(self.__entries) > self.__max_size:
+            self.__entries.popitem(last=False)
+
+
+class CachedMedia(ReusableMedia, io.FileIO):
+    pass
+
+
+class UploadLink(str):
+    """``file://`` url of a hard link to a cached file, removed by ``close`` once it was sent."""
+
+    def close(self) -> None:
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+class DiskByteCache:
+    """Size-bounded on-disk cache of downloaded media bytes with LRU eviction.
+
+    Files are named after the hash of the asset id and keep its extension, so the
+    content type can be recovered after a restart without a separate index. The
+    directory can be shared by several processes; files cached by another one
+    are picked up on first use. Files handed to a local Bot API server by path
+    are hard-linked under ``uploads/`` first, so eviction cannot remove them
+    before they were sent.
+    """
+
+    # Upload links older than this are left over from a crash and removed on startup.
+    UPLOAD_LINK_TTL = 24 * 3600
+
+    def __init__(self, path: str, max_bytes: int) -> None:
+        self.__path = os.path.abspath(path)
+        self.__uploads = os.path.join(self.__path, "uploads")
+        self.__max_bytes = max_bytes
+        self.__entries = OrderedDict()
+        self.__size = 0
+        self.__lock = threading.Lock()
+
+        os.makedirs(self.__uploads, exist_ok=True)
+
+        expired = time.time() - self.UPLOAD_LINK_TTL
+        for entry in os.scandir(self.__uploads):
+            if entry.is_file() and entry.stat().st_mtime < expired:
+                os.remove(entry.path)
+
+        files = []
+        for entry in os.scandir(path):
+            if entry.is_file() and not entry.name.endswith(".part"):
+                stat = entry.stat()
+                files.append((stat.st_mtime, entry.name, stat.st_size))
+
+        for _, name, size in sorted(files):
+            self.__entries[name] = size
+            self.__size += size
+
+    def __filename(self, asset_id: str) -> str:
+        return cache_key(asset_id) + os.path.splitext(asset_id)[1]
+
+    def open(self, asset_id: str) -> Any:
+        """Return a file object named ``asset_id`` for a cached asset, or None."""
+        filename = self.__filename(asset_id)
+        filepath = os.path.join(self.__path, filename)
+
+        with self.__lock:
+            try:
+                mediafile = CachedMedia(filepath, "rb")
+            except FileNotFoundError:
+                self.__size -= self.__entries.pop(filename, 0)
+                return None
+
+            if filename not in self.__entries:
+                self.__entries[filename] = os.fstat(mediafile.fileno()).st_size
+                self.__size += self.__entries[filename]
+            self.__entries.move_to_end(filename)
+
+            now = time.time()
+            os.utime(filepath, (now, now))
+
+        mediafile.name = asset_id
+        mediafile.path = filepath
+        return mediafile
+
+    def link(self, mediafile: Any) -> UploadLink:
+        """Hard-link a file returned by ``open`` to a path of its own, untouched by eviction.
+
+        Raises ``OSError`` when the file was already evicted or cannot be linked.
+        """
+        linkpath = os.path.join(self.__uploads, uuid.uuid4().hex + os.path.splitext(mediafile.path)[1])
+        os.link(mediafile.path, linkpath)
+
+        link = UploadLink(f"file://{linkpath}")
+        link.path = linkpath
+        return link
+
+    def put(self, asset_id: str, mediafile: Any) -> None:
+        """Copy ``mediafile`` into the cache and rewind it. Safe to call from worker threads."""
+        filename = self.__filename(asset_id)
+        filepath = os.path.join(self.__path, filename)
+        partpath = f"{filepath}.{threading.get_ident()}.part"
+
+        mediafile.seek(0)
+        with open(partpath, "wb") as part:
+            shutil.copyfileobj(mediafile, part)
+            size = part.tell()
+        mediafile.seek(0)
+
+        if size > self.__max_bytes:
+            os.remove(partpath)
+            return
+
+        with self.__lock:
+            os.replace(partpath, filepath)
+            self.__size += size - self.__entries.pop(filename, 0)
+            self.__entries[filename] = size
+            self.__evict()
+
+    def __evict(self) -> None:
+        while self.__size > self.__max_bytes and self.__entries:
+            filename, size = self.__entries.popitem(last=False)
+            self.__size -= size
+            try:
+                os.remove(os.path.join(self.__path, filename))
+            except FileNotFoundError:
+                pass
+
+
+class FeedCache:
+    """TTL cache of parsed feed pages with single-flight loading.
+
+    ``loader`` is called with the validators (``ETag``/``Last-Modified``) of the
+    expired entry, if any, and returns either ``(value, validators)``,
+    ``FeedCache.NOT_MODIFIED`` to keep the expired value for another ``ttl``, or
+    None on failure, which is never cached. Concurrent misses on the same key
+    share a single load.
+    """
+
+    NOT_MODIFIED = object()
+
+    def __init__(self, ttl: int = 300, max_size: int = 1000) -> None:
+        self.__ttl = ttl
+        self.__max_size = max_size
+        self.__entries = OrderedDict()
+        self.__inflight = dict()
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.revalidated = 0
+
+    async def get(self, key: tuple, loader: Callable[[dict], Awaitable[Any]]) -> Any:
+        entry = self.__entries.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self.hits += 1
+            self.__entries.move_to_end(key)
+            return entry[1]
+
+        task = self.__inflight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            return await asyncio.shield(task)
+
+        self.misses += 1
+        task = asyncio.ensure_future(self.__load(key, entry, loader))
+        self.__inflight[key] = task
+        return await asyncio.shield(task)
+
+    async def __load(self, key: tuple, entry: tuple | None, loader: Callable[[dict], Awaitable[Any]]) -> Any:
+        try:
+            result = await loader(entry[2] if entry else {})
+        finally:
+            self.__inflight.pop(key, None)
+
+        if result is self.NOT_MODIFIED and entry is not None:
+            self.revalidated += 1
+            value, validators = entry[1], entry[2]
+        elif result is None or result is self.NOT_MODIFIED:
+            return None
+        else:
+            value, validators = result
+
+        self.__entries[key] = (time.monotonic() + self.__ttl, value, validators)
+        self.__entries.move_to_end(key)
+
+        while len(self.__entries) > self.__max_size:
+            self.__entries.popitem(last=False)
+
+        return value
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "revalidated": self.revalidated,
+            "size": len(self.__entries),
+        }
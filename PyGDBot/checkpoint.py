@@ -0,0 +1,39 @@
+import time
+import sqlite3
+
+
+class CheckpointStore:
+    """Last ``next_max_id`` reached by a whole-profile run, persisted in SQLite.
+
+    Checkpoints are keyed by (chat, username, feature) so an interrupted run can
+    resume where it left off.
+    """
+
+    def __init__(self, path: str = "checkpoints.db") -> None:
+        self.__conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self.__conn.execute("PRAGMA journal_mode=WAL")
+        self.__conn.execute(
+            "CREATE TABLE IF NOT EXISTS checkpoints ("
+            "chat_id INTEGER NOT NULL, username TEXT NOT NULL, feature TEXT NOT NULL, "
+            "next_max_id TEXT NOT NULL, updated REAL NOT NULL, "
+            "PRIMARY KEY (chat_id, username, feature))"
+        )
+
+    def get(self, chat_id: int, username: str, feature: str) -> str | None:
+        row = self.__conn.execute(
+            "SELECT next_max_id FROM checkpoints WHERE chat_id = ? AND username = ? AND feature = ?",
+            (chat_id, username, feature)
+        ).fetchone()
+        return row[0] if row else None
+
+    def save(self, chat_id: int, username: str, feature: str, next_max_id: str) -> None:
+        self.__conn.execute(
+            "INSERT OR REPLACE INTO checkpoints (chat_id, username, feature, next_max_id, updated) VALUES (?, ?, ?, ?, ?)",
+            (chat_id, username, feature, next_max_id, time.time())
+        )
+
+    def drop(self, chat_id: int, username: str, feature: str) -> None:
+        self.__conn.execute(
+            "DELETE FROM checkpoints WHERE chat_id = ? AND username = ? AND feature = ?",
+            (chat_id, username, feature)
+        )
@@ -0,0 +1,68 @@
+import time
+import sqlite3
+
+from collections import OrderedDict
+from typing import Iterable
+
+
+class DeliveryHistory:
+    """Media already delivered to each chat, persisted in SQLite.
+
+    Ids known to be delivered are also kept in an in-memory set per chat, for
+    the ``max_chats`` most recently used chats, so filtering a page that was
+    sent before never touches the disk. Ids missing from the set are looked up
+    in the database, which other processes may have written to.
+    """
+
+    def __init__(self, path: str = "history.db", max_chats: int = 1000) -> None:
+        self.__max_chats = max_chats
+        self.__sets = OrderedDict()
+
+        self.__conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self.__conn.execute("PRAGMA journal_mode=WAL")
+        self.__conn.execute(
+            "CREATE TABLE IF NOT EXISTS deliveries ("
+            "chat_id INTEGER NOT NULL, media_id TEXT NOT NULL, sent REAL NOT NULL, "
+            "PRIMARY KEY (chat_id, media_id)) WITHOUT ROWID"
+        )
+
+    def __set(self, chat_id: int) -> set:
+        known = self.__sets.pop(chat_id, None)
+        if known is None:
+            known = set()
+        self.__sets[chat_id] = known
+
+        while len(self.__sets) > self.__max_chats:
+            self.__sets.popitem(last=False)
+        return known
+
+    def seen(self, chat_id: int, media_ids: Iterable[str]) -> set:
+        """Return the ids among ``media_ids`` already delivered to ``chat_id``."""
+        known = self.__set(chat_id)
+        media_ids = set(media_ids)
+        unknown = list(media_ids - known)
+
+        for start in range(0, len(unknown), 500):
+            batch = unknown[start:start + 500]
+            rows = self.__conn.execute(
+                f"SELECT media_id FROM deliveries WHERE chat_id = ? AND media_id IN ({','.join('?' * len(batch))})",
+                (chat_id, *batch)
+            )
+            known.update(row[0] for row in rows)
+
+        return media_ids & known
+
+    def add(self, chat_id: int, media_ids: Iterable[str]) -> None:
+        media_ids = [media_id for media_id in media_ids if media_id]
+        if not media_ids: return
+
+        now = time.time()
+        self.__conn.executemany(
+            "INSERT OR IGNORE INTO deliveries (chat_id, media_id, sent) VALUES (?, ?, ?)",
+            [(chat_id, media_id, now) for media_id in media_ids]
+        )
+        self.__set(chat_id).update(media_ids)
+
+    def clear(self, chat_id: int) -> None:
+        self.__conn.execute("DELETE FROM deliveries WHERE chat_id = ?", (chat_id,))
+        self.__sets.pop(chat_id, None)
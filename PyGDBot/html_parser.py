@@ -1,10 +1,17 @@
-from bs4 import BeautifulSoup
-from pyquery import PyQuery as pq
+from functools import lru_cache
 
 
 class HtmlParser:
+    """CSS selector helpers over BeautifulSoup, PyQuery and lxml.
+
+    Each backend is imported on first use, so importing the bot does not pay
+    for the ones it never calls.
+    """
+
     @staticmethod
     def bs4_parser(html, selector):
+        from bs4 import BeautifulSoup
+
         result = None
         try:
             html = BeautifulSoup(html, "lxml")
@@ -16,6 +23,8 @@ class HtmlParser:
 
     @staticmethod
     def pyq_parser(html, selector):
+        from pyquery import PyQuery as pq
+
         result = None
         try:
             html = pq(html)
@@ -24,3 +33,31 @@ class HtmlParser:
             print(e)
         finally:
             return result
+
+    @staticmethod
+    @lru_cache(maxsize=64)
+    def compile_selector(selector: str, attr: str) -> "etree.XPath":
+        """Translate a CSS ``selector`` into an XPath returning ``attr`` of every match, once."""
+        from lxml import etree
+        from cssselect import GenericTranslator
+
+        return etree.XPath(f"{GenericTranslator().css_to_xpath(selector)}/@{attr}", smart_strings=False)
+
+    @staticmethod
+    def attr_parser(html, selector, attr):
+        """Return ``attr`` of every element matching ``selector`` in document order.
+
+        The document is parsed once with lxml and the attribute values come
+        straight out of a precompiled XPath, without building a PyQuery or
+        BeautifulSoup object per element.
+        """
+        from lxml import html as lxml_html
+
+        result = []
+        try:
+            if html:
+                result = HtmlParser.compile_selector(selector, attr)(lxml_html.fromstring(html))
+        except Exception as e:
+            print(e)
+        finally:
+            return result
@@ -0,0 +1,325 @@
+import io
+import os
+import re
+import asyncio
+import logging
+import aiohttp
+
+from tempfile import SpooledTemporaryFile
+from typing import Any
+from PyGDBot.ratelimit import TokenBucket, backoff_delay, parse_retry_after
+
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+CONTENT_RANGE_PATTERN = re.compile(r'bytes \d+-\d+\/(\d+)')
+
+
+class HttpResponse:
+    def __init__(self, status_code: int, reason: str, headers: Any, content: bytes) -> None:
+        self.status_code = status_code
+        self.reason = reason
+        self.headers = headers
+        self.content = content
+
+
+class ReusableMedia:
+    """Mixin for media files that may be uploaded more than once.
+
+    aiohttp closes a file object once it has been uploaded, which would make a
+    retried upload impossible, so ``close`` only rewinds the file and
+    ``discard`` actually releases it.
+    """
+
+    def close(self) -> None:
+        if not self.closed: self.seek(0)
+
+    def discard(self) -> None:
+        super().close()
+
+
+class SpooledMedia(ReusableMedia, SpooledTemporaryFile, io.IOBase):
+    """Spooled temporary file that keeps the filename telebot uploads it under.
+
+    Data stays in memory up to ``max_size`` bytes and is rolled over to a
+    temporary file on disk beyond that.
+    """
+
+    def __init__(self, name: str, max_size: int) -> None:
+        super().__init__(max_size=max_size, mode="w+b")
+        self.__name = name
+
+    @property
+    def name(self) -> str:
+        return self.__name
+
+
+class AsyncHttpClient:
+    """Asyncio HTTP client sharing one connection pool across every chat.
+
+    The underlying ``aiohttp.ClientSession`` is created lazily so the client can
+    be constructed outside of a running event loop. Requests given a ``limiter``
+    wait for its budget, and 429/5xx responses or connection errors are retried
+    up to ``retries`` times, honoring ``Retry-After`` or backing off
+    exponentially with jitter.
+    """
+
+    CHUNK_SIZE = 64 * 1024
+
+    def __init__(self, limit: int = 100, limit_per_host: int = 8) -> None:
+        self.__limit = limit
+        self.__limit_per_host = limit_per_host
+        self.__session = None
+        self.__logger = logging.getLogger(self.__class__.__name__)
+
+    def __get_session(self) -> aiohttp.ClientSession:
+        if self.__session is None or self.__session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=self.__limit,
+                limit_per_host=self.__limit_per_host,
+                ttl_dns_cache=300
+            )
+            self.__session = aiohttp.ClientSession(connector=connector)
+        return self.__session
+
+    @staticmethod
+    def __clean_headers(headers: dict | None) -> dict:
+        return {key: value for key, value in (headers or {}).items() if value is not None}
+
+    async def __backoff(self, url: str, response: HttpResponse | None, limiter: TokenBucket | None, attempt: int) -> None:
+        delay = None
+        if response is not None:
+            delay = parse_retry_after(response.headers.get("Retry-After"))
+        if delay is None:
+            delay = backoff_delay(attempt)
+
+        self.__logger.warning(
+            f"Retrying {url} in {delay:.1f}s (attempt {attempt + 1}, status {response.status_code if response else 'error'})."
+        )
+
+        if response is not None and response.status_code == 429 and limiter is not None:
+            limiter.penalize(delay)
+        else:
+            await asyncio.sleep(delay)
+
+    async def request(
+        self,
+        method: str,
+        url: str,
+        headers: dict | None = None,
+        timeout: int = 240,
+        limiter: TokenBucket | None = None,
+        retries: int = 3
+    ) -> HttpResponse:
+        session = self.__get_session()
+
+        for attempt in range(retries + 1):
+            if limiter is not None: await limiter.acquire()
+
+            try:
+                async with session.request(
+                    method=method,
+                    url=url,
+                    headers=self.__clean_headers(headers),
+                    timeout=aiohttp.ClientTimeout(total=timeout)
+                ) as resp:
+                    content = await resp.read()
+                    response = HttpResponse(resp.status, resp.reason, resp.headers, content)
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                if attempt == retries: raise
+                await self.__backoff(url, None, limiter, attempt)
+                continue
+
+            if response.status_code not in RETRY_STATUSES or attempt == retries:
+                return response
+            await self.__backoff(url, response, limiter, attempt)
+
+    async def download(
+        self,
+        url: str,
+        name: str,
+        headers: dict | None = None,
+        timeout: int = 240,
+        max_size: int = 8 * 1024 * 1024,
+        limiter: TokenBucket | None = None,
+        retries: int = 3,
+        segment_size: int = 0,
+        segments: int = 4
+    ) -> tuple[HttpResponse, SpooledMedia | None]:
+        """Stream the body of ``url`` into a ``SpooledMedia`` chunk by chunk.
+
+        The file is only returned for a 200 response and is rewound, ready to be
+        handed to telebot as is.
+
+        With ``segment_size``, only the first ``segment_size`` bytes are asked
+        for. When the server answers with a range, the rest of the body is
+        fetched in ranges of that size, ``segments`` at a time, written in place
+        into a file preallocated to the full size, and a range cut short is
+        resumed from its last byte. Servers without range support answer the
+        first request with the whole body, which is then streamed as usual.
+        """
+        session = self.__get_session()
+
+        for attempt in range(retries + 1):
+            if limiter is not None: await limiter.acquire()
+
+            request_headers = self.__clean_headers(headers)
+            if segment_size:
+                request_headers["Range"] = f"bytes=0-{segment_size - 1}"
+
+            spool = None
+            try:
+                async with session.request(
+                    method="GET",
+                    url=url,
+                    headers=request_headers,
+                    timeout=aiohttp.ClientTimeout(total=timeout)
+                ) as resp:
+                    total = self.__range_total(resp.headers.get("Content-Range")) if resp.status == 206 else None
+
+                    if total is not None:
+                        spool = SpooledMedia(name=name, max_size=max_size)
+                        if total > max_size: self.__preallocate(spool, total)
+
+                        await self.__fetch_segments(
+                            session, url, request_headers, spool, resp, total, segment_size, segments, timeout, limiter, retries
+                        )
+
+                        spool.seek(0)
+                        return HttpResponse(200, "OK", resp.headers, b""), spool
+                    elif resp.status != 200:
+                        content = await resp.read()
+                        response = HttpResponse(resp.status, resp.reason, resp.headers, content)
+                    else:
+                        spool = SpooledMedia(name=name, max_size=max_size)
+                        async for chunk in resp.content.iter_chunked(self.CHUNK_SIZE):
+                            spool.write(chunk)
+
+                        spool.seek(0)
+                        return HttpResponse(resp.status, resp.reason, resp.headers, b""), spool
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                if spool is not None: spool.discard()
+                if attempt == retries: raise
+                await self.__backoff(url, None, limiter, attempt)
+                continue
+            except BaseException:
+                if spool is not None: spool.discard()
+                raise
+
+            if response.status_code not in RETRY_STATUSES or attempt == retries:
+                return response, None
+            await self.__backoff(url, response, limiter, attempt)
+
+    @staticmethod
+    def __range_total(content_range: str | None) -> int | None:
+        matches = CONTENT_RANGE_PATTERN.match(content_range or "")
+        if matches:
+            return int(matches.group(1))
+
+    @staticmethod
+    def __preallocate(spool: SpooledMedia, size: int) -> None:
+        """Move ``spool`` to disk and reserve ``size`` bytes for it up front."""
+        spool.rollover()
+        try:
+            os.posix_fallocate(spool.fileno(), 0, size)
+        except (AttributeError, OSError):
+            spool.truncate(size)
+
+    async def __fetch_segments(
+        self,
+        session: aiohttp.ClientSession,
+        url: str,
+        headers: dict,
+        spool: SpooledMedia,
+        first: aiohttp.ClientResponse,
+        total: int,
+        segment_size: int,
+        segments: int,
+        timeout: int,
+        limiter: TokenBucket | None,
+        retries: int
+    ) -> None:
+        """Fill ``spool`` with the ``total`` bytes of ``url``, the first range coming from ``first``."""
+        slots = asyncio.Semaphore(max(1, segments - 1))
+
+        async def fetch(start: int, end: int) -> None:
+            async with slots:
+                await self.__fetch_range(session, url, headers, spool, start, end, timeout, limiter, retries)
+
+        tasks = [
+            asyncio.create_task(
+                self.__fetch_range(session, url, headers, spool, 0, min(segment_size, total) - 1, timeout, limiter, retries, first)
+            )
+        ]
+        tasks.extend(
+            asyncio.create_task(fetch(start, min(start + segment_size, total) - 1))
+            for start in range(segment_size, total, segment_size)
+        )
+
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
+        self.__logger.debug(f"Downloaded {total} bytes of {url} in {len(tasks)} ranges.")
+
+    async def __fetch_range(
+        self,
+        session: aiohttp.ClientSession,
+        url: str,
+        headers: dict,
+        spool: SpooledMedia,
+        start: int,
+        end: int,
+        timeout: int,
+        limiter: TokenBucket | None,
+        retries: int,
+        resp: aiohttp.ClientResponse | None = None
+    ) -> None:
+        """Write bytes ``start`` to ``end`` of ``url`` at the same offsets of ``spool``.
+
+        ``resp`` is an already open response for that range. When a range breaks
+        off, it is asked for again from the first byte still missing.
+        """
+        offset = start
+
+        async def write(response: aiohttp.ClientResponse) -> None:
+            nonlocal offset
+            async for chunk in response.content.iter_chunked(self.CHUNK_SIZE):
+                spool.seek(offset)
+                spool.write(chunk)
+                offset += len(chunk)
+
+        for attempt in range(retries + 1):
+            try:
+                if resp is not None:
+                    await write(resp)
+                else:
+                    if limiter is not None: await limiter.acquire()
+
+                    async with session.request(
+                        method="GET",
+                        url=url,
+                        headers=dict(headers, Range=f"bytes={offset}-{end}"),
+                        timeout=aiohttp.ClientTimeout(total=timeout)
+                    ) as ranged:
+                        if ranged.status != 206:
+                            raise aiohttp.ClientResponseError(
+                                ranged.request_info, ranged.history, status=ranged.status, message=ranged.reason
+                            )
+                        await write(ranged)
+
+                if offset > end: return
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                if attempt == retries: raise
+            resp = None
+
+            if attempt < retries: await self.__backoff(url, None, limiter, attempt)
+
+        raise aiohttp.ClientPayloadError(f"Range {start}-{end} of {url} stopped at {offset}.")
+
+    async def close(self) -> None:
+        if self.__session is not None and not self.__session.closed:
+            await self.__session.close()
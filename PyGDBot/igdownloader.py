@@ -1,35 +1,77 @@
-import io
 import os
 import re
-import json
+import time
+import signal
+import asyncio
 import logging
-import inspect
-import hashlib
+import mimetypes
 
-from requests.sessions import Session
-from telebot import types, async_telebot
+from telebot import types, async_telebot, asyncio_helper
+from telebot.asyncio_helper import ApiTelegramException
+from collections import deque
+from contextlib import aclosing
 from urllib.parse import quote
 from datetime import datetime
-from PyGDBot.logger import setup_logging
+from PyGDBot.logger import setup_logging, log_context
 from PyGDBot.exception import *
 from PyGDBot.html_parser import HtmlParser
-from faker import Faker
+from PyGDBot.http_client import AsyncHttpClient
+from PyGDBot.cache import FileIdCache, DiskByteCache, FeedCache
+from PyGDBot.media import (
+    QUALITIES, extract_records, select_media, pick_url, url_expiry, json_loads, shortcode_from_link, shortcode_to_media_id
+)
+from PyGDBot.session import ChatSession, create_session_store
+from PyGDBot.checkpoint import CheckpointStore
+from PyGDBot.history import DeliveryHistory
+from PyGDBot.journal import DeliveryJournal
+from PyGDBot.scheduler import CURRENT_JOB, Job, JobScheduler
+from PyGDBot.jobqueue import SQLiteJobScheduler
+from PyGDBot.ratelimit import RateLimiters, backoff_delay, parse_retry_after
+from PyGDBot.batcher import MediaBatcher
+from PyGDBot.transcode import ImageRecompressor
+from PyGDBot.useragent import UserAgentPool
+from PyGDBot.metrics import (
+    MetricsServer, timed, STAGE_SECONDS, BYTES, CACHE_REQUESTS, FEED_CACHE, HTTP_ERRORS, JOBS, SESSIONS_IN_FLIGHT,
+    RATE_LIMIT_TOKENS, RATE_LIMIT_BLOCKED, RATE_LIMIT_THROTTLED
+)
 from typing import Any
 from dotenv import load_dotenv
 
 
 class PyGDTelebot:
+    PHOTO_MAX_SIZE = 10 * 1024 * 1024
+
     def __init__(self) -> Any:
         load_dotenv()
 
+        # Processes sharing a job queue must share chat sessions and file ids too.
+        if os.environ.get("JOB_QUEUE_DB"):
+            os.environ["SESSION_BACKEND"] = "sqlite"
+            os.environ.setdefault("MEDIA_CACHE_DB", "media.db")
+
+        # A local Bot API server uploads media straight from disk, so downloads go to the byte cache.
+        self.__local_api = os.environ.get("TELEGRAM_API_URL")
+        if self.__local_api:
+            asyncio_helper.API_URL = f"{self.__local_api.rstrip('/')}/bot{{0}}/{{1}}"
+            asyncio_helper.FILE_URL = f"{self.__local_api.rstrip('/')}/file/bot{{0}}/{{1}}"
+            os.environ.setdefault("MEDIA_CACHE_DIR", "cache")
+
+        self.__upload_max_size = int(
+            os.environ.get("TELEGRAM_UPLOAD_MAX_SIZE", (2000 if self.__local_api else 50) * 1024 * 1024)
+        )
+
         TOKEN = os.environ.get("TELEBOT_TOKEN")
         self.__bot = async_telebot.AsyncTeleBot(token=TOKEN)
 
         self.__cookie = os.environ.get("IG_COOKIE")
+        self.__ig_base_url = os.environ.get("IG_BASE_URL", "https://www.instagram.com").rstrip("/")
 
         self.__parser = HtmlParser()
-        self.__session = Session()
-        self.__fake = Faker()
+        self.__session = AsyncHttpClient(
+            limit=int(os.environ.get("HTTP_POOL_LIMIT", 100)),
+            limit_per_host=int(os.environ.get("HTTP_LIMIT_PER_HOST", 8))
+        )
+        self.__user_agents = UserAgentPool(size=int(os.environ.get("USER_AGENT_POOL_SIZE", 100)))
 
         self.__headers = dict()
         self.__headers["Accept"] = "application/json, text/plain, */*"
@@ -39,18 +81,43 @@ class PyGDTelebot:
         self.__headers["Sec-Fetch-Site"] = "same-site"
         self.__headers["Cookie"] = self.__cookie
 
-        self.__http_error_status_code = None
-        self.__http_error_reason = None
-        self.__func_name = None
-        self.__is_stop = False
-        self.__is_click = 0
-        self.__message_id = None
-        self.__medias = []
-        self.__next_max_id = None
-        self.__msg_text = ""
+        self.__sessions = create_session_store()
+        self.__spool_max_size = int(os.environ.get("SPOOL_MAX_SIZE", 8 * 1024 * 1024))
+        self.__prefetch_size = int(os.environ.get("PREFETCH_SIZE", 6))
+        self.__download_workers = int(os.environ.get("DOWNLOAD_WORKERS", 3))
+        self.__segment_size = int(os.environ.get("DOWNLOAD_SEGMENT_SIZE", 0))
+        self.__segments = int(os.environ.get("DOWNLOAD_SEGMENTS", 4))
+        self.__file_ids = FileIdCache(path=os.environ.get("MEDIA_CACHE_DB"))
+        self.__byte_cache = DiskByteCache(
+            path=os.environ.get("MEDIA_CACHE_DIR"),
+            max_bytes=int(os.environ.get("MEDIA_CACHE_MAX_BYTES", 1024 * 1024 * 1024))
+        ) if os.environ.get("MEDIA_CACHE_DIR") else None
+        self.__feed_cache = FeedCache(ttl=int(os.environ.get("FEED_CACHE_TTL", 300)))
+        self.__url_refresh_margin = int(os.environ.get("URL_REFRESH_MARGIN", 900))
+        self.__checkpoints = CheckpointStore(path=os.environ.get("CHECKPOINT_DB", "checkpoints.db"))
+        self.__history = DeliveryHistory(path=os.environ.get("HISTORY_DB", "history.db"))
+        self.__journal = DeliveryJournal(path=os.environ.get("JOURNAL_DB", "journal.db"))
+        # WORKER_PROCESSES=0 runs jobs in this process, which then keeps the whole budget.
+        self.__limiters = RateLimiters(share=max(1, int(os.environ.get("WORKER_PROCESSES", 1))))
+        self.__retries = int(os.environ.get("HTTP_RETRIES", 3))
+        self.__recompressor = ImageRecompressor(
+            workers=int(os.environ.get("RECOMPRESS_WORKERS", 2)),
+            quality=int(os.environ.get("RECOMPRESS_JPEG_QUALITY", 85)),
+            max_size=self.__spool_max_size
+        )
+        self.__album_max_items = int(os.environ.get("ALBUM_MAX_ITEMS", 10))
+        self.__album_max_bytes = int(os.environ.get("ALBUM_MAX_BYTES", 50 * 1024 * 1024))
+        self.__album_max_delay = float(os.environ.get("ALBUM_MAX_DELAY", 5))
+        self.__scheduler = SQLiteJobScheduler(
+            runner=self.__run_job,
+            path=os.environ.get("JOB_QUEUE_DB"),
+            workers=int(os.environ.get("JOB_WORKERS", 4))
+        ) if os.environ.get("JOB_QUEUE_DB") else JobScheduler(
+            runner=self.__run_job,
+            workers=int(os.environ.get("JOB_WORKERS", 4))
+        )
         self.__pathdir = os.getcwd()
 
-        self.__current_func = lambda: inspect.getouterframes(inspect.currentframe())[1][3]
         self.__delws = lambda text: re.sub(r'\s', '', text)
         self.__mkdir = lambda folder_name: os.mkdir(path=os.path.join(self.__pathdir, folder_name))
         self.__instructions = lambda chat_id: self.__bot.send_message(chat_id=chat_id, text=f"Unrecognized command. Say what?")
@@ -60,6 +127,28 @@ class PyGDTelebot:
         setup_logging()
         self.__logger = logging.getLogger(self.__class__.__name__)
 
+        self.__metrics = MetricsServer(
+            host=os.environ.get("METRICS_HOST", "127.0.0.1"),
+            port=int(os.environ.get("METRICS_PORT"))
+        ) if os.environ.get("METRICS_PORT") else None
+
+        FEED_CACHE.collect = lambda: {
+            (result,): count for result, count in self.__feed_cache.stats().items() if result != "size"
+        }
+        JOBS.collect = lambda: {
+            ("queued",): self.__scheduler.status(0)["total_queued"],
+            ("running",): self.__scheduler.status(0)["total_running"],
+        }
+        RATE_LIMIT_TOKENS.collect = lambda: {
+            (name,): bucket["tokens"] for name, bucket in self.__limiters.snapshot().items()
+        }
+        RATE_LIMIT_BLOCKED.collect = lambda: {
+            (name,): bucket["blocked_for"] for name, bucket in self.__limiters.snapshot().items()
+        }
+        RATE_LIMIT_THROTTLED.collect = lambda: {
+            (name,): bucket["throttled"] for name, bucket in self.__limiters.snapshot().items()
+        }
+
        
         @self.__bot.message_handler(commands=["help"])
         async def helper(message):
@@ -72,7 +161,9 @@ class PyGDTelebot:
                     "You can control me by sending these commands :\n\n"
                     "/start - Starting the <a href='https://t.me/itsPyGD_bot'>bot</a>\n"
                     "/features - Shows the features of this bot.\n"
-                    "/stop - Stops media delivery.\n\n"
+                    "/stop - Stops media delivery and cancels your queued jobs.\n"
+                    "/status - Shows your queued jobs and the progress of the running one.\n"
+                    "/quality - Sets the resolution of the media you receive (original, 1080p, 720p, 480p).\n\n"
                     "📖 Description of features:\n"
                     "   ✮ <i>All Media</i> - Images and Videos from Instagram user posts.\n"
                     "   ✮ <i>Images</i> - Images from Instagram user posts.\n"
@@ -83,13 +174,27 @@ class PyGDTelebot:
                     "       ○ Complete this :\n"
                     "           username = <b>(Required)</b>\n"
                     "           max_id = <b>(Optional)</b>\n"
+                    "           pages = <b>(Optional, number of pages or all)</b>\n"
+                    "           max_mb = <b>(Optional, stop paging after this many MB)</b>\n"
                     "       ○ Application example :\n"
                     "           username = iam_muhfalihr\n"
                     "         -------------------- or --------------------\n"
                     "           username = iam_muhfalihr\n"
-                    "           max_id = 12345678_987654321\n\n"
+                    "           max_id = 12345678_987654321\n"
+                    "         -------------------- or --------------------\n"
+                    "           username = iam_muhfalihr\n"
+                    "           pages = all\n"
+                    "         -------------------- or --------------------\n"
+                    "           username = iam_muhfalihr, _____mfr.py\n"
+                    "       ○ Several usernames separated by commas are queued as separate jobs,\n"
+                    "         priority = <b>(Optional)</b> moves them ahead of your other jobs.\n"
+                    "       ○ With pages, the next pages are sent automatically and an\n"
+                    "         interrupted run resumes where it left off (resume = no to start over).\n"
+                    "       ○ new = <b>yes</b> only sends media you have not received before,\n"
+                    "         always starts from the newest page and stops paging at the first\n"
+                    "         page you already have.\n\n"
                     "   ✮ <i>Link Downloader</i> :\n"
-                    "       Send Instagram User Post link!\n\n"
+                    "       Send Instagram User Post link! Several links can be sent in one message.\n\n"
                     "Please use this bot happily and calmly.\n"
                     "Greetings of peace from @muhammadfalihromadhoni 💙\n\n"
                     "🌟 Follow my Github <a href='https://github.com/muhfalihr'>muhfalihr</a>\n"
@@ -114,16 +219,17 @@ class PyGDTelebot:
         async def option(call):
             id = call.message.chat.id
             call_data = call.data
-            self.__is_click += 1
+            session = self.__sessions.get(id)
+            session.is_click += 1
 
             match call_data:
                 case "All Media" | "Images" | "Videos":
-                    self.__func_name = call_data
+                    session.func_name = call_data
 
-                    if self.__is_click > 1:
+                    if session.is_click > 1:
                         message = await self.__bot.edit_message_text(
                             chat_id=id, 
-                            message_id=self.__message_id, 
+                            message_id=session.message_id, 
                             text=(
                                 f"<i><b>{call_data} Feature</b></i>\n\n"
                                 "<code>username = (Required)</code>\n"
@@ -132,7 +238,7 @@ class PyGDTelebot:
                             ),
                             parse_mode="HTML"
                         )
-                        self.__message_id = message.message_id
+                        session.message_id = message.message_id
                     else:
                         message = await self.__bot.send_message(
                             chat_id=id,
@@ -145,21 +251,21 @@ class PyGDTelebot:
                             ),
                             parse_mode="HTML"
                         )
-                        self.__message_id = message.message_id
+                        session.message_id = message.message_id
 
                 case "Link Downloader":
-                    self.__func_name = call_data
+                    session.func_name = call_data
 
-                    if self.__is_click > 1:
+                    if session.is_click > 1:
                         message = await self.__bot.edit_message_text(
                             chat_id=id, 
-                            message_id=self.__message_id, 
+                            message_id=session.message_id, 
                             text=(
                                 "OK. Send Instagram User Post link!.\n"
                                 "Confused? See /help."
                             )
                         )
-                        self.__message_id = message.message_id
+                        session.message_id = message.message_id
                     else:
                         message = await self.__bot.send_message(
                             chat_id=id,
@@ -168,7 +274,9 @@ class PyGDTelebot:
                                 "Confused? See /help."
                             )
                         )
-                        self.__message_id = message.message_id
+                        session.message_id = message.message_id
+
+            self.__sessions.save(session)
         
         @self.__bot.callback_query_handler(func=lambda call: True if call.data in ["yes", "no"] else False)
         async def is_continue(call):
@@ -177,14 +285,18 @@ class PyGDTelebot:
 
             match call.data:
                 case "yes":
-                    self.__is_stop = False
+                    self.__sessions.set_stop(id, False)
+                    self.__journal.set_stop(id, False)
                     await self.__bot.edit_message_text(chat_id=id, message_id=message_id, reply_markup=None, text="🟢 Continue sending media...")
-                    await self.__media_processor(id=id)
+                    self.__scheduler.submit(Job(chat_id=id, kind="resume", params={}, priority=1, label="Continue sending media"))
                 
                 case "no":
-                    self.__is_stop = False
+                    self.__sessions.set_stop(id, False)
+                    self.__journal.end(id)
                     await self.__bot.edit_message_text(chat_id=id, message_id=message_id, reply_markup=None, text="OK, if you don't want to continue. /features")
-                    self.__is_click = 0
+                    session = self.__sessions.get(id)
+                    session.is_click = 0
+                    self.__sessions.save(session)
 
 
         @self.__bot.message_handler(commands=["start", "hello"])
@@ -221,47 +333,95 @@ class PyGDTelebot:
 
             await self.__bot.send_message(chat_id=id,text="Report sent successfully. Thank you🙏. /help")
 
+        @self.__bot.message_handler(commands=["quality"])
+        async def quality(message):
+            id = message.chat.id
+            session = self.__sessions.get(id)
+            args = message.text.split()[1:]
+
+            if args and args[0].lower() in QUALITIES:
+                session.quality = args[0].lower()
+                self.__sessions.save(session)
+                await self.__bot.send_message(chat_id=id, text=f"✅ Media will be sent in {session.quality} quality.")
+            else:
+                await self.__bot.send_message(
+                    chat_id=id,
+                    text=(
+                        f"Current quality : <b>{session.quality}</b>\n"
+                        f"Change it with <code>/quality {' | '.join(QUALITIES)}</code>"
+                    ),
+                    parse_mode="HTML"
+                )
+
         @self.__bot.message_handler(commands=["stop"])
         async def stop_generate(message):
-            self.__is_stop = True
+            self.__sessions.set_stop(message.chat.id, True)
+            self.__journal.set_stop(message.chat.id, True)
+            self.__scheduler.cancel(message.chat.id)
+
+        @self.__bot.message_handler(commands=["status"])
+        async def status(message):
+            status = self.__scheduler.status(message.chat.id)
+            running = status["running"]
+
+            progress = (
+                f"▶️ Running : <i>{running.label}</i> ({running.done}/{running.total or '?'} media)\n"
+                if running else "▶️ Running : nothing\n"
+            )
+            await self.__bot.send_message(
+                chat_id=message.chat.id,
+                text=(
+                    "📊 <b>Status</b>\n\n"
+                    f"{progress}"
+                    f"⏳ Your queued jobs : {status['queued']}\n\n"
+                    f"Bot queue depth : {status['total_queued']}\n"
+                    f"Jobs running : {status['total_running']}/{status['workers']}"
+                ),
+                parse_mode="HTML"
+            )
 
-        @self.__bot.message_handler(func=lambda message: True if self.__func_name in ["All Media", "Images", "Videos"] and message.text else False)
+        @self.__bot.message_handler(func=lambda message: True if self.__sessions.get(message.chat.id).func_name in ["All Media", "Images", "Videos"] and message.text else False)
         async def media_sender(message):
             id = message.chat.id
             msg = message.text
+            session = self.__sessions.get(id)
 
             if re.match(pattern=r'(username|max_id) = .+', string=msg):
                 parameters = dict()
-                parameters.update({"feature": self.__func_name})
+                parameters.update({"feature": session.func_name})
 
                 for param in msg.split("\n"):
                     parameter = self.__delws(param).split("=")
                     parameters.update({parameter[0]: parameter[1]})
 
-                await self.__bot.send_message(
-                    chat_id=id,
-                    text=(
-                        "Please Wait....\n"
-                        f"🟢 This process may take a {'little' if self.__func_name != 'Videos' else 'long'} time so please be patient and wait until the notification message appears."
-                    )
-                )
-
-                try:
-                    medias, next_max_id = self.__media_url_getter(**parameters)
+                priority = parameters.pop("priority", "0")
+                if not re.fullmatch(r'-?\d+', priority):
+                    return await self.__instructions(chat_id=id)
+                priority = int(priority)
+                usernames = [username for username in parameters.pop("username", "").split(",") if username]
 
-                    self.__medias = medias
-                    self.__next_max_id = next_max_id
-                    self.__msg_text = msg
+                if not usernames:
+                    return await self.__instructions(chat_id=id)
 
-                    await self.__media_processor(id=id)
+                for username in usernames:
+                    job = Job(
+                        chat_id=id,
+                        kind="feed",
+                        params=dict(parameters, username=username, msg_text=msg),
+                        priority=priority,
+                        label=f"{session.func_name} of {username}"
+                    )
+                    queued = self.__scheduler.submit(job)
 
-                except Exception:
-                    await self.__http_error(chat_id=id)
+                await self.__bot.send_message(
+                    chat_id=id,
+                    text=f"📥 {len(usernames)} job(s) queued, {queued} waiting for this chat. See /status."
+                )
 
             else:
                 await self.__instructions(chat_id=id)
 
-        @self.__bot.message_handler(func=lambda message: True if self.__func_name == "Link Downloader" and message else False)
+        @self.__bot.message_handler(func=lambda message: True if self.__sessions.get(message.chat.id).func_name == "Link Downloader" and message else False)
         async def media_sender_from_ld(message):
             id = message.chat.id
             param = message.text
@@ -269,111 +429,659 @@ class PyGDTelebot:
             pattern = r'https:\/\/www\.instagram\.com\/.+(\/.+\/\?(utm_source=ig_web_copy_link|igsh=.+)|\/\d+\?utm_source=.+&igsh=.+)'
 
             try:
-                if re.match(pattern=pattern, string=param):
+                links = [link for link in param.split() if re.match(pattern=pattern, string=link)]
+
+                if links:
+                    for link in links:
+                        queued = self.__scheduler.submit(Job(chat_id=id, kind="link", params={"link": link}, label=link))
+
                     await self.__bot.send_message(
                         chat_id=id,
-                        text="🟢 Please Wait...."
+                        text=f"📥 {len(links)} link(s) queued, {queued} waiting for this chat. See /status."
                     )
 
-                    try:
-                        medias = self.__linkdownloader(param)
+                else:
+                    await self.__instructions(chat_id=id)
 
-                        media_group = []
+            except (IndexError, AttributeError):
+                await self.__instructions(chat_id=id)
+    
+    async def __run_job(self, job: Job):
+        SESSIONS_IN_FLIGHT.inc()
+        job.error = None
+        token = CURRENT_JOB.set(job)
+        try:
+            with log_context(chat_id=job.chat_id, job_id=job.id):
+                entry = self.__journal.get(job.chat_id) if job.resumed else None
+                if entry and entry["kind"] == "feed" and entry["session"]:
+                    # A job requeued after its worker died carries on from its last acknowledged album.
+                    self.__restore(entry)
+                    return await self.__run_resume_job(job)
+
+                if job.kind != "resume":
+                    self.__journal.begin(job.chat_id, job.kind, job.params, job.priority, job.label)
+
+                match job.kind:
+                    case "feed":
+                        await self.__run_feed_job(job)
+                    case "link":
+                        await self.__run_link_job(job)
+                    case "resume":
+                        await self.__run_resume_job(job)
+                    case _:
+                        raise FunctionNotFoundError(f"Unknown job kind {job.kind}")
+        finally:
+            CURRENT_JOB.reset(token)
+            SESSIONS_IN_FLIGHT.dec()
+
+    async def __run_feed_job(self, job: Job):
+        id = job.chat_id
+        parameters = dict(job.params)
+        msg = parameters.pop("msg_text", "")
+        pages = parameters.pop("pages", None)
+        max_mb = parameters.pop("max_mb", None)
+        resume = parameters.pop("resume", "yes") != "no"
+        only_new = parameters.pop("new", "no") == "yes"
+
+        session = self.__sessions.get(id)
+        session.func_name = parameters.get("feature")
+        session.only_new = only_new
+        self.__sessions.set_stop(id, False)
+
+        await self.__bot.send_message(
+            chat_id=id,
+            text=(
+                f"Please Wait.... ({job.label})\n"
+                f"🟢 This process may take a {'little' if session.func_name != 'Videos' else 'long'} time so please be patient and wait until the notification message appears."
+            )
+        )
 
-                        for media in medias:
-                            data, filename, content_type = self.__download(media)
+        try:
+            session.msg_text = msg
+            session.username = parameters.get("username")
 
-                            databyte = io.BytesIO(data)
-                            databyte.name = filename
+            if pages:
+                max_id = parameters.get("max_id")
+                checkpoint = self.__checkpoints.get(id, session.username, session.func_name)
 
-                            if databyte:
-                                if len(media_group) == 5: media_group.clear()
+                # New posts appear on the first page, so "new = yes" always starts from the top.
+                if not max_id and resume and not only_new and checkpoint:
+                    max_id = checkpoint
+                    await self.__bot.send_message(
+                        chat_id=id,
+                        text=f"🔁 Resuming from the last checkpoint, max_id = <code>{checkpoint}</code>",
+                        parse_mode="HTML"
+                    )
 
-                                if len(media_group) < 5:
-                                    if "image" in content_type:
-                                        media_group.append(types.InputMediaPhoto(media=databyte))
-                                    elif "video" in content_type:
-                                        media_group.append(types.InputMediaVideo(media=databyte))
+                session.profile_mode = True
+                session.pages_left = None if pages == "all" else int(pages)
+                session.byte_budget = int(float(max_mb) * 1024 * 1024) if max_mb else None
+                session.bytes_sent = 0
+                session.medias = []
+                session.next_max_id = max_id
+                self.__sessions.save(session)
+                self.__journal.save(session.to_dict())
 
-                                if len(media_group) == 5:
-                                    await self.__bot.send_media_group(chat_id=id,media=media_group)
+                await self.__profile_delivery(id=id)
+            else:
+                medias, next_max_id = await self.__media_url_getter(**dict(parameters, quality=session.quality))
 
-                        if media_group:
-                            await self.__bot.send_media_group(chat_id=id,media=media_group)
+                session.profile_mode = False
+                session.medias = medias
+                session.page_max_id = parameters.get("max_id")
+                session.next_max_id = next_max_id
+                self.__sessions.save(session)
+                self.__journal.save(session.to_dict())
 
-                        await self.__bot.send_message(chat_id=id, text="Done 😊")
-                        self.__func_name = None
-                        self.__is_click = 0
+                await self.__media_processor(id=id)
 
-                    except Exception:
-                        await self.__http_error(chat_id=id)
+        except Exception:
+            await self.__http_error(job)
 
-                else:
-                    await self.__instructions(chat_id=id)
+    async def __run_link_job(self, job: Job):
+        id = job.chat_id
+        link = job.params["link"]
 
-            except IndexError:
-                await self.__instructions(chat_id=id)
-    
-    async def __http_error(self, chat_id: str):
-        if self.__http_error_reason and self.__http_error_status_code is not None:
+        await self.__bot.send_message(
+            chat_id=id,
+            text="🟢 Please Wait...."
+        )
+
+        try:
+            quality = self.__sessions.get(id).quality
+            with timed(STAGE_SECONDS, stage="link_resolve"), log_context(stage="link_resolve"):
+                medias = [media async for media in self.__linkdownloader(link, quality=quality)]
+            job.total = len(medias)
+
+            batcher = self.__batcher(chat_id=id)
+            try:
+                async with aclosing(self.__prefetch(medias, quality=quality)) as downloads:
+                    async for mediafile, filename, content_type in downloads:
+                        url = medias[job.done]
+                        job.done += 1
+
+                        size = self.__media_size(mediafile)
+                        if self.__route(content_type, size) != "group":
+                            await self.__send_single(id, mediafile, filename, content_type, url)
+                            continue
+
+                        await self.__batch(batcher, mediafile, filename, content_type, size)
+
+                await batcher.flush()
+            finally:
+                # An album left pending by a failed download is dropped, not sent after the error.
+                for item in batcher.cancel():
+                    self.__close_media(item.media)
+
+            await self.__bot.send_message(chat_id=id, text="Done 😊")
+            session = self.__sessions.get(id)
+            session.func_name = None
+            session.is_click = 0
+            self.__sessions.save(session)
+            self.__journal.end(id)
+
+        except Exception:
+            await self.__http_error(job)
+
+    async def __run_resume_job(self, job: Job):
+        id = job.chat_id
+
+        if self.__sessions.get(id).profile_mode:
+            await self.__profile_delivery(id=id, resume=True)
+        else:
+            await self.__media_processor(id=id)
+
+    async def __http_error(self, job: Job):
+        chat_id = job.chat_id
+        self.__journal.end(chat_id)
+
+        if job.error:
+            status_code, reason = job.error
             await self.__bot.send_message(
                 chat_id=chat_id,
-                text=f"❌ Error! status code {self.__http_error_status_code} : {self.__http_error_reason}"
+                text=f"❌ Error! status code {status_code} : {reason}"
             )
             await self.__bot.send_message(chat_id=chat_id, text="Sorry🙏 Please report this issue. /report")
         else:
             await self.__bot.send_message(chat_id=chat_id, text=f"❌ Error! A request to the Telegram API was unsuccessful.")
             await self.__bot.send_message(chat_id=chat_id, text="Sorry🙏 Please Try Again 😥. /report")
 
-    async def __media_processor(self, id: str):
-        
-        medias_copy = list(self.__medias)
+    @staticmethod
+    def __upstream_error(resp: Any) -> None:
+        """Record a failed upstream response on the running job, for the error message sent to its chat."""
+        job = CURRENT_JOB.get()
+        if job is not None:
+            job.error = (resp.status_code, resp.reason)
+
+    async def __prefetch(self, medias: list, quality: str = "original"):
+        """Download ``medias`` in order while keeping up to ``PREFETCH_SIZE`` downloads in flight.
+
+        At most ``DOWNLOAD_WORKERS`` of them hit the CDN at once. The limit is per
+        call, so chats download side by side, and the global load is capped by
+        ``HTTP_LIMIT_PER_HOST`` and the CDN rate limiter. Downloads still pending
+        when the consumer stops early are cancelled.
+        """
+        remaining = iter(medias)
+        pending = deque()
+        workers = asyncio.Semaphore(self.__download_workers)
+
+        def fill():
+            while len(pending) < self.__prefetch_size:
+                url = next(remaining, None)
+                if url is None: return
+                pending.append(asyncio.create_task(self.__fetch_media(url, quality, workers)))
 
-        media_group = []
-        for media in medias_copy:
+        try:
+            fill()
+            while pending:
+                result = await pending.popleft()
+                fill()
+                yield result
+        finally:
+            for task in pending:
+                task.cancel()
+
+            for task in pending:
+                try:
+                    mediafile, _, _ = await task
+                    self.__close_media(mediafile)
+                except BaseException:
+                    pass
+
+    async def __fetch_media(self, url: str, quality: str, workers: asyncio.Semaphore) -> Any:
+        """Resolve ``url`` to something telebot can send, cheapest source first.
+
+        A Telegram ``file_id`` from an earlier upload needs no download and no
+        upload, a file from the on-disk byte cache needs no download, and only
+        otherwise is the media downloaded from the CDN. Below the original
+        quality, images still larger than asked for are downscaled, and the
+        result is cached apart from the original. The CDN download waits for a
+        slot of ``workers``.
+        """
+        asset_id = self.__asset_id(url)
+        side = QUALITIES.get(quality)
+        if asset_id and side:
+            asset_id = f"{quality}-{asset_id}"
+
+        if asset_id:
+            cached = self.__file_ids.get(asset_id)
+            CACHE_REQUESTS.inc(cache="file_id", result="hit" if cached else "miss")
+            if cached:
+                file_id, content_type = cached
+                return file_id, asset_id, content_type
+
+            if self.__byte_cache is not None:
+                mediafile = self.__byte_cache.open(asset_id)
+                CACHE_REQUESTS.inc(cache="bytes", result="hit" if mediafile else "miss")
+                if mediafile:
+                    return mediafile, asset_id, mimetypes.guess_type(asset_id)[0]
+
+        async with workers:
+            with log_context(stage="cdn_download"):
+                mediafile, filename, content_type = await self.__download(url)
+
+        if side and "image" in content_type:
+            mediafile = await self.__recompressor.recompress(mediafile, side)
+        filename = asset_id or filename
+
+        if asset_id and self.__byte_cache is not None:
+            await asyncio.to_thread(self.__byte_cache.put, asset_id, mediafile)
+
+            if self.__local_api:
+                cached = self.__byte_cache.open(asset_id)
+                if cached:
+                    self.__close_media(mediafile)
+                    mediafile = cached
+
+        return mediafile, filename, content_type
+
+    @staticmethod
+    def __close_media(mediafile: Any) -> None:
+        if hasattr(mediafile, "discard"):
+            mediafile.discard()
+        elif hasattr(mediafile, "close"):
+            mediafile.close()
+
+    @timed(STAGE_SECONDS, stage="telegram_upload")
+    async def __telegram_call(self, send: Any, files: list) -> Any:
+        """Call ``send`` within the Telegram budget, retrying on 429 and 5xx errors.
+
+        ``files`` are rewound before every attempt and released afterwards.
+        """
+        limiter = self.__limiters.get("telegram")
+
+        with log_context(stage="telegram_upload"):
+            try:
+                for attempt in range(self.__retries + 1):
+                    await limiter.acquire(tokens=len(files))
 
-            if self.__is_stop: break
+                    for file in files:
+                        if hasattr(file, "seek"): file.seek(0)
 
-            data, filename, content_type = self.__download(media)
-            self.__medias.pop(0)
+                    try:
+                        result = await send()
+                        BYTES.inc(sum(self.__media_size(file) for file in files), direction="upload")
+                        return result
+                    except ApiTelegramException as e:
+                        HTTP_ERRORS.inc(upstream="telegram", status=e.error_code)
+                        if (e.error_code != 429 and e.error_code < 500) or attempt == self.__retries: raise
+
+                        parameters = (e.result_json or {}).get("parameters") or {}
+                        delay = parse_retry_after(parameters.get("retry_after"))
+
+                        if e.error_code == 429:
+                            self.__limiters.penalize("telegram", delay if delay is not None else backoff_delay(attempt))
+                        else:
+                            await asyncio.sleep(backoff_delay(attempt))
+            finally:
+                for file in files:
+                    self.__close_media(file)
+
+    def __batcher(self, chat_id: str, on_sent: Any = None) -> MediaBatcher:
+        """Album batcher of ``chat_id``, calling ``on_sent(filenames)`` once each album was handled."""
+        async def send(media: list, filenames: list):
+            try:
+                await self.__send_media_group(chat_id=chat_id, media=media, filenames=filenames)
+            except Exception:
+                await self.__bot.send_message(chat_id=chat_id, text="😥 Failed to send media.")
 
-            databyte = io.BytesIO(data)
-            databyte.name = filename
+            if on_sent: on_sent(filenames)
 
-            match self.__func_name:
-                case "All Media" | "Videos":
-                    if len(media_group) == 3: media_group.clear()
+        return MediaBatcher(
+            send=send,
+            max_items=self.__album_max_items,
+            max_bytes=self.__album_max_bytes,
+            max_delay=self.__album_max_delay
+        )
 
-                    if len(media_group) < 3:
-                        if "image" in content_type:
-                            media_group.append(types.InputMediaPhoto(media=databyte))
-                        if "video" in content_type:
-                            media_group.append(types.InputMediaVideo(media=databyte))
-                    
-                    try:
-                        if len(media_group) == 3:
-                            await self.__bot.send_media_group(id=id,media=media_group)
-                    except Exception:
-                        await self.__bot.send_message(chat_id=id, text="😥 Failed to send media.")
+    async def __batch(self, batcher: MediaBatcher, mediafile: Any, filename: str, content_type: str, size: int) -> bool:
+        """Queue a photo or video on ``batcher``, and tell whether it was queued."""
+        if "video" in content_type:
+            item = types.InputMediaVideo(media=self.__upload(mediafile))
+        elif "image" in content_type:
+            item = types.InputMediaPhoto(media=self.__upload(mediafile))
+        else:
+            self.__close_media(mediafile)
+            return False
 
-                case "Images":
-                    if len(media_group) == 5: media_group.clear()
+        await batcher.add(item, filename, size=0 if isinstance(item.media, str) else size)
+        return True
 
-                    if len(media_group) < 5:
-                        media_group.append(types.InputMediaPhoto(media=databyte))
-                    
-                    try:
-                        if len(media_group) == 5:
-                            await self.__bot.send_media_group(chat_id=id, media=media_group)
-                    except Exception:
-                        await self.__bot.send_message(chat_id=id, text="😥 Failed to send media.")
+    async def __send_media_group(self, chat_id: str, media: list, filenames: list) -> Any:
+        """Send an album and remember the ``file_id`` of every photo and video in it.
+
+        A lone media is sent on its own, since an album needs at least two.
+        """
+        if len(media) == 1:
+            item = media[0]
+            send = self.__bot.send_video if isinstance(item, types.InputMediaVideo) else self.__bot.send_photo
+            messages = [await self.__telegram_call(lambda: send(chat_id, item.media), [item.media])]
+        else:
+            messages = await self.__telegram_call(
+                lambda: self.__bot.send_media_group(chat_id=chat_id, media=media),
+                [item.media for item in media]
+            )
+
+        self.__history.add(chat_id, [self.__media_id(filename) for filename in filenames])
+
+        for message, filename in zip(messages, filenames):
+            if not re.search(r'\.(jpg|mp4)$', filename): continue
+
+            if message.photo:
+                self.__file_ids.put(filename, message.photo[-1].file_id, "image/jpeg")
+            elif message.video:
+                self.__file_ids.put(filename, message.video.file_id, "video/mp4")
+
+        return messages
+
+    async def __feed_pages(self, feature: str, username: str, max_id: str | None, pages: int | None, quality: str = "original"):
+        """Yield ``(medias, next_max_id)`` page after page, following ``next_max_id``.
+
+        The next page is fetched in the background while the current one is being
+        delivered. At most ``pages`` pages are fetched, or all of them when None.
+        """
+        def fetch(cursor: str | None) -> asyncio.Task:
+            return asyncio.create_task(
+                self.__media_url_getter(feature=feature, username=username, max_id=cursor, quality=quality)
+            )
+
+        fetched = 1
+        next_page = fetch(max_id)
+        try:
+            while next_page:
+                medias, next_max_id = await next_page
+                next_page = None
+
+                if next_max_id and (pages is None or fetched < pages):
+                    next_page = fetch(next_max_id)
+                    fetched += 1
+
+                yield medias, next_max_id
+        finally:
+            if next_page: next_page.cancel()
+
+    async def __profile_delivery(self, id: str, resume: bool = False):
+        """Deliver a profile page after page until the page count or byte budget runs out.
+
+        The ``next_max_id`` of every fully delivered page is checkpointed. With
+        ``resume``, the media left over from a stopped page are delivered first.
+        A page is checkpointed once all its media are sent, even when the chat
+        stopped during its last album.
+        """
+        session = self.__sessions.get(id)
+
+        if resume and session.medias:
+            await self.__deliver(id=id)
+            stopped = self.__sessions.is_stopped(id)
+            if stopped and self.__sessions.get(id).medias:
+                return await self.__finish(id=id)
+            if not self.__page_done(id) or stopped:
+                return await self.__finish(id=id)
+
+        session = self.__sessions.get(id)
+        if resume and not self.__more_pages(session):
+            return await self.__finish(id=id)
+
+        feed_pages = self.__feed_pages(
+            feature=session.func_name,
+            username=session.username,
+            max_id=session.next_max_id,
+            pages=session.pages_left,
+            quality=session.quality
+        )
+        async with aclosing(feed_pages) as pages:
+            async for medias, next_max_id in pages:
+                session = self.__sessions.get(id)
+                session.medias = medias
+                session.page_max_id = session.next_max_id
+                session.next_max_id = next_max_id
+                self.__checkpoint(session)
+
+                all_sent = await self.__deliver(id=id)
+
+                # A /stop during the last album still leaves a fully delivered page.
+                stopped = self.__sessions.is_stopped(id)
+                if stopped and self.__sessions.get(id).medias: break
+                if all_sent and not stopped:
+                    # Not checkpointed, so a later run does not start below the newest page.
+                    await self.__bot.send_message(chat_id=id, text="⏭ Reached media you already have, stopping here.")
+                    break
+                if not self.__page_done(id) or stopped: break
+
+        await self.__finish(id=id)
+
+    def __page_done(self, id: str) -> bool:
+        """Checkpoint a fully delivered page and tell whether another page may follow."""
+        session = self.__sessions.get(id)
+
+        if session.next_max_id:
+            self.__checkpoints.save(id, session.username, session.func_name, session.next_max_id)
+        else:
+            self.__checkpoints.drop(id, session.username, session.func_name)
+
+        if session.pages_left is not None:
+            session.pages_left -= 1
+        self.__checkpoint(session)
+
+        return self.__more_pages(session)
+
+    @staticmethod
+    def __more_pages(session: ChatSession) -> bool:
+        """Tell whether the page count and byte budget of ``session`` allow another page."""
+        if session.byte_budget is not None and session.bytes_sent >= session.byte_budget:
+            return False
+        return bool(session.next_max_id) and session.pages_left != 0
+
+    def __route(self, content_type: str, size: int) -> str:
+        """Tell how a media of ``size`` bytes is sent : in an album, as a document, or as a link."""
+        if size > self.__upload_max_size:
+            return "link"
+        if "image" in content_type and size > self.PHOTO_MAX_SIZE:
+            return "document"
+        return "group"
+
+    def __upload(self, mediafile: Any) -> Any:
+        """Hand a cached file to a local Bot API server by path instead of uploading its bytes.
+
+        The path is a hard link removed once the media was sent, so the file
+        survives cache evictions while it waits in an album.
+        """
+        if self.__local_api and hasattr(mediafile, "path") and self.__byte_cache is not None:
+            try:
+                link = self.__byte_cache.link(mediafile)
+            except OSError:
+                return mediafile
+
+            self.__close_media(mediafile)
+            return link
+        return mediafile
+
+    async def __send_single(self, chat_id: str, mediafile: Any, filename: str, content_type: str, url: str) -> None:
+        """Send a media too large for an album as a document, or its link past the upload limit."""
+        try:
+            if self.__route(content_type, self.__media_size(mediafile)) == "link":
+                self.__close_media(mediafile)
+                await self.__bot.send_message(
+                    chat_id=chat_id,
+                    text=f"📦 {filename} is too large to upload, download it here :\n{url}"
+                )
+            else:
+                document = self.__upload(mediafile)
+                await self.__telegram_call(
+                    lambda: self.__bot.send_document(chat_id=chat_id, document=document),
+                    [document]
+                )
+                self.__history.add(chat_id, [self.__media_id(filename)])
+        except Exception:
+            await self.__bot.send_message(chat_id=chat_id, text="😥 Failed to send media.")
+
+    @staticmethod
+    def __media_id(filename: str) -> str | None:
+        """Asset id a media was fetched under, without its quality prefix."""
+        if re.search(r'\.(jpg|mp4)$', filename):
+            return re.sub(r'^\d+p-', '', filename)
+
+    @staticmethod
+    def __media_size(mediafile: Any) -> int:
+        if isinstance(mediafile, str): return 0
+
+        position = mediafile.tell()
+        size = mediafile.seek(0, os.SEEK_END)
+        mediafile.seek(position)
+        return size
+
+    async def __media_processor(self, id: str):
+        await self.__deliver(id=id)
+        await self.__finish(id=id)
+
+    def __skip_sent(self, session: Any) -> bool:
+        """Drop the media already delivered to the chat and tell whether that was all of them."""
+        asset_ids = [self.__asset_id(url) for url in session.medias]
+        seen = self.__history.seen(session.chat_id, [asset_id for asset_id in asset_ids if asset_id])
+        if not seen:
+            return False
+
+        total = len(session.medias)
+        session.medias = [url for url, asset_id in zip(session.medias, asset_ids) if asset_id not in seen]
+        self.__checkpoint(session)
+
+        self.__logger.info(f"Skipped {total - len(session.medias)} of {total} media already sent to {session.chat_id}.")
+        return not session.medias
+
+    async def __deliver(self, id: str) -> bool:
+        """Send the media of the session, and tell whether every one had been sent before.
+
+        A media leaves ``session.medias`` only once the album or message carrying
+        it was handled, and the session is journaled then, so a restart resends
+        nothing Telegram already accepted.
+        """
+        session = self.__sessions.get(id)
+        all_sent = session.only_new and self.__skip_sent(session)
+        await self.__refresh_urls(session)
+        medias_copy = list(session.medias)
+
+        job = self.__scheduler.current(id)
+        if job: job.total += len(medias_copy)
+
+        batched = dict()
+
+        def acknowledge(urls: list) -> None:
+            for url in urls:
+                if url in session.medias: session.medias.remove(url)
+            self.__checkpoint(session)
+
+        batcher = self.__batcher(
+            chat_id=id,
+            on_sent=lambda filenames: acknowledge([batched[filename].popleft() for filename in filenames])
+        )
         try:
-            if media_group: await self.__bot.send_media_group(chat_id=id,media=media_group)
-        except Exception: pass
+            async with aclosing(self.__prefetch(medias_copy, quality=session.quality)) as downloads:
+                for url in medias_copy:
+                    mediafile, filename, content_type = await anext(downloads)
+
+                    if self.__sessions.is_stopped(id):
+                        self.__close_media(mediafile)
+                        break
+
+                    size = self.__media_size(mediafile)
+                    session.bytes_sent += size
+                    if job: job.done += 1
+
+                    if self.__route(content_type, size) != "group":
+                        await self.__send_single(id, mediafile, filename, content_type, url)
+                        acknowledge([url])
+                        continue
+
+                    batched.setdefault(filename, deque()).append(url)
+                    if not await self.__batch(batcher, mediafile, filename, content_type, size):
+                        acknowledge([batched[filename].pop()])
+
+            await batcher.flush()
+        finally:
+            # Media of an album that was never sent stay in the journal, to be sent after a restart.
+            for item in batcher.cancel():
+                self.__close_media(item.media)
+
+        return all_sent
+
+    async def __refresh_urls(self, session: Any) -> None:
+        """Sign again the media urls of the session expiring within ``URL_REFRESH_MARGIN`` seconds.
+
+        Media left over from a stopped run may wait for hours, past the expiry
+        of their CDN urls. The page they came from is fetched again, once and
+        bypassing the feed cache, and every expiring url is swapped for the
+        fresh url of the same asset.
+        """
+        deadline = time.time() + self.__url_refresh_margin
+        expiring = {url for url in session.medias if (url_expiry(url) or deadline) < deadline}
+        if not expiring or not session.username: return
+
+        try:
+            with log_context(stage="url_refresh"):
+                page = await self.__feed_page(
+                    username=session.username,
+                    count=max(33, len(session.medias)),
+                    max_id=session.page_max_id,
+                    validators={}
+                )
+        except Exception as e:
+            return self.__logger.error(f"Could not sign the expiring urls of {session.chat_id} again : {e}")
+        if not page: return
+
+        (records, _), _ = page
+        fresh = dict()
+        for record in records:
+            url = pick_url(record, session.quality)
+            asset_id = self.__asset_id(url)
+            if asset_id: fresh[asset_id] = (url, record.post_id)
+
+        renewed = [fresh.get(self.__asset_id(url) or "") if url in expiring else None for url in session.medias]
+        session.medias = [new[0] if new else url for url, new in zip(session.medias, renewed)]
+        self.__checkpoint(session)
+
+        renewed = [new for new in renewed if new]
+        self.__logger.info(
+            f"Signed {len(renewed)} of {len(expiring)} expiring urls of {len({post_id for _, post_id in renewed})} posts again."
+        )
+
+    def __checkpoint(self, session: Any) -> None:
+        """Save the delivery progress of ``session`` and journal it for the running job of its chat.
+
+        Only the fields the job owns are written, since the chat may have
+        changed its quality or picked another feature in the meantime.
+        """
+        self.__journal.save(self.__sessions.save_progress(session).to_dict())
+
+    def __restore(self, entry: dict) -> None:
+        """Put back the session journaled in ``entry``, with its stop flag."""
+        self.__sessions.save(ChatSession.from_dict(entry["session"]))
+        self.__sessions.set_stop(entry["chat_id"], entry["is_stop"])
+
+    async def __finish(self, id: str):
+        session = self.__sessions.get(id)
 
-        if self.__is_stop:
+        if self.__sessions.is_stopped(id):
             await self.__bot.send_message(chat_id=id, text=f"🛑 Stops media delivery...")
-            self.__func_name = self.__func_name
 
             markup = types.InlineKeyboardMarkup()
             yes = types.InlineKeyboardButton("Yes", callback_data='yes')
@@ -381,28 +1089,31 @@ class PyGDTelebot:
             
             markup.add(yes, no)
             await self.__bot.send_message(chat_id=id, text="🧐 Do you want to continue?", reply_markup=markup)
-            self.__medias = self.__medias
         else:
-            if self.__next_max_id:
+            if session.next_max_id:
                 await self.__bot.send_message(
                     chat_id=id,
                     text=(
-                        f"Your previous message : \n<code>{self.__msg_text}</code>\n\n"
-                        f"Max ID for next media = <code>{self.__next_max_id}</code>"
+                        f"Your previous message : \n<code>{session.msg_text}</code>\n\n"
+                        f"Max ID for next media = <code>{session.next_max_id}</code>"
                     ),
                     parse_mode="HTML"
                 )
-                self.__is_click = 0
+                session.is_click = 0
             else:
                 await self.__bot.send_message(chat_id=id, text="Done 😊")
-                self.__func_name = None
-                self.__is_click = 0
+                session.func_name = None
+                session.is_click = 0
+
+            session.profile_mode = False
+            self.__sessions.save(session)
+            self.__journal.end(id)
 
             await self.__bot.send_message(chat_id=id,text="To continue or not, specify in /features.")
                 
 
     def __Csrftoken(self) -> str:
-        self.__logger.info("Retrieves X-Csrf-Token from cookie.")
+        self.__logger.debug("Retrieves X-Csrf-Token from cookie.")
 
         pattern = re.compile(r'csrftoken=([a-zA-Z0-9_-]+)')
         matches = pattern.search(self.__cookie)
@@ -416,42 +1127,50 @@ class PyGDTelebot:
                 )
             )
 
-    def __download(self, url: str) -> Any:
-        self.__logger.info(f"Carry out the process to retrieve content, filename, and content_type in the {self.__current_func()} function.")
+    def __asset_id(self, url: str) -> str | None:
+        pattern = re.compile(r'\/([^\/?]+\.jpg)')
+        matches = pattern.search(url)
+        if matches:
+            return matches.group(1)
 
-        user_agent = self.__fake.user_agent()
-        self.__headers["User-Agent"] = user_agent
+        pattern = re.compile(r'\/([^\/?]+\.mp4)')
+        matches = pattern.search(url)
+        if matches:
+            return matches.group(1)
 
-        self.__logger.info("Make a request to the URL of the media from which the content will be retrieved using the GET method.")
+    def __filename(self, url: str) -> str:
+        return self.__asset_id(url) or f"PyGDownloader{datetime.now().strftime('%Y%m%d%H%M%S')}"
 
-        resp = self.__session.request(
-            method="GET",
+    @timed(STAGE_SECONDS, stage="cdn_download")
+    async def __download(self, url: str) -> Any:
+        self.__logger.debug(f"Carry out the process to retrieve content, filename, and content_type of {url}.")
+
+        headers = dict(self.__headers)
+        headers["User-Agent"] = self.__user_agents.get()
+
+        filename = self.__filename(url)
+
+        resp, mediafile = await self.__session.download(
             url=url,
+            name=filename,
             timeout=240,
-            headers=self.__headers
+            headers=headers,
+            max_size=self.__spool_max_size,
+            limiter=self.__limiters.get("instagram_cdn"),
+            retries=self.__retries,
+            segment_size=self.__segment_size if filename.endswith(".mp4") else 0,
+            segments=self.__segments
         )
-        status_code = resp.status_code
-        data = resp.content
-        if status_code == 200:
-            pattern = re.compile(r'\/([^\/?]+\.jpg)')
-            matches = pattern.search(url)
-            if matches:
-                filename = matches.group(1)
-            else:
-                pattern = re.compile(r'\/([^\/?]+\.mp4)')
-                matches = pattern.search(url)
-                if matches:
-                    filename = matches.group(1)
-                else:
-                    filename = f"PyGDownloader{datetime.now().strftime('%Y%m%d%H%M%S')}"
+        if resp.status_code == 200:
             content_type = resp.headers.get("Content-Type")
+            BYTES.inc(self.__media_size(mediafile), direction="download")
 
-            self.__logger.info("content, filename, and content type have been successfully obtained.")
+            self.__logger.debug(f"{filename} ({content_type}) has been successfully obtained.")
 
-            return data, filename, content_type
+            return mediafile, filename, content_type
         else:
-            self.__http_error_status_code = resp.status_code
-            self.__http_error_reason = resp.reason
+            HTTP_ERRORS.inc(upstream="instagram_cdn", status=resp.status_code)
+            self.__upstream_error(resp)
 
             self.__logger.error(
                 HTTPErrorException(
@@ -459,91 +1178,77 @@ class PyGDTelebot:
                 )
             )
 
-    def __media_url_getter(self, **kwargs) -> Any:
+    async def __media_url_getter(self, **kwargs) -> Any:
 
         feature = kwargs.get("feature")
 
         self.__logger.info(f"Retrieves {feature} from specified Instagram user posts.")
 
         username = kwargs.get("username")
-        count = kwargs.get("count", 33)
+        count = int(kwargs.get("count", 33))
         max_id = kwargs.get("max_id", None)
+        quality = kwargs.get("quality", "original")
+
+        with log_context(stage="feed_fetch"):
+            page = await self.__feed_cache.get(
+                (username, max_id, count),
+                lambda validators: self.__feed_page(username=username, count=count, max_id=max_id, validators=validators)
+            )
+        self.__logger.debug(f"Feed page cache : {self.__feed_cache.stats()}")
+
+        if page is None:
+            return None
+
+        records, next_max_id = page
+        medias = [pick_url(record, quality) for record in select_media(records, feature)]
+
+        return medias, next_max_id
 
-        user_agent = self.__fake.user_agent()
+    def __api_headers(self) -> dict:
+        headers = dict(self.__headers)
+        headers["User-Agent"] = self.__user_agents.get()
+        headers["X-Asbd-Id"] = "129477"
+        headers["X-Csrftoken"] = self.__Csrftoken()
+        headers["X-Ig-App-Id"] = "936619743392459"
+        return headers
 
-        url = f"https://www.instagram.com/api/v1/feed/user/{username}/username/?count={count}&max_id={max_id}"\
-            if max_id else f"https://www.instagram.com/api/v1/feed/user/{username}/username/?count={count}"
+    @timed(STAGE_SECONDS, stage="feed_fetch")
+    async def __feed_page(self, username: str, count: int, max_id: str | None, validators: dict) -> Any:
+        url = f"{self.__ig_base_url}/api/v1/feed/user/{username}/username/?count={count}&max_id={max_id}"\
+            if max_id else f"{self.__ig_base_url}/api/v1/feed/user/{username}/username/?count={count}"
 
-        self.__headers["User-Agent"] = user_agent
-        self.__headers["X-Asbd-Id"] = "129477"
-        self.__headers["X-Csrftoken"] = self.__Csrftoken()
-        self.__headers["X-Ig-App-Id"] = "936619743392459"
+        headers = self.__api_headers()
+        headers["If-None-Match"] = validators.get("ETag")
+        headers["If-Modified-Since"] = validators.get("Last-Modified")
 
         self.__logger.info("Make a request to the URL Instagram User Media using the GET method.")
 
-        resp = self.__session.request(
+        resp = await self.__session.request(
             method="GET",
             url=url,
-            headers=self.__headers,
-            timeout=240
+            headers=headers,
+            timeout=240,
+            limiter=self.__limiters.get("instagram_api"),
+            retries=self.__retries
         )
         status_code = resp.status_code
         content = resp.content
         if status_code == 200:
-            response = content.decode('utf-8')
-            data = json.loads(response)
+            data = json_loads(content)
             next_max_id = data.get("next_max_id", None)
 
-            medias = []
-
-            for item in data.get("items", []):
-                match feature:
-                    case "All Media":
-                        if item.get("carousel_media"):
-                            images = [
-                                max(i.get("image_versions2", {}).get("candidates", []), key=lambda x: x.get("width", 0) * x.get("height", 0)).get("url")
-                                for i in item.get("carousel_media", [])
-                                if i.get("video_versions", None) == None
-                            ]
-                            medias.extend(images)
-
-                        elif item.get("video_versions", None) == None:
-                            images = [max(item.get("image_versions2", {}).get("candidates", []), key=lambda x: x.get("width", 0) * x.get("height", 0)).get("url")]
-                            medias.extend(images)
-
-                        videos = [
-                                max(i.get("video_versions", []), key=lambda x: x.get("width", 0) * x.get("height", 0)).get("url")
-                                for i in item.get("carousel_media", [item])
-                                if i.get("video_versions")
-                            ]
-                        medias.extend(videos)
-
-                    case "Images":
-                        if item.get("carousel_media"):
-                            images = [
-                                max(i.get("image_versions2", {}).get("candidates", []), key=lambda x: x.get("width", 0) * x.get("height", 0)).get("url")
-                                for i in item.get("carousel_media", [])
-                                if i.get("video_versions", None) == None
-                            ]
-                            medias.extend(images)
-
-                        elif item.get("video_versions", None) == None:
-                            images = [max(item.get("image_versions2", {}).get("candidates", []), key=lambda x: x.get("width", 0) * x.get("height", 0)).get("url")]
-                            medias.extend(images)
-
-                    case "Videos":
-                        videos = [
-                            max(i.get("video_versions", []), key=lambda x: x.get("width", 0) * x.get("height", 0)).get("url")
-                            for i in item.get("carousel_media", [item])
-                            if i.get("video_versions")
-                        ]
-                        medias.extend(videos)
-            
-            return medias, next_max_id
-                    
+            validators = {
+                "ETag": resp.headers.get("ETag"),
+                "Last-Modified": resp.headers.get("Last-Modified")
+            }
+            return (extract_records(data.get("items", [])), next_max_id), validators
+
+        elif status_code == 304:
+            return FeedCache.NOT_MODIFIED
+
         else:
-            self.__http_error_status_code = resp.status_code
-            self.__http_error_reason = resp.reason
+            HTTP_ERRORS.inc(upstream="instagram_api", status=resp.status_code)
+            self.__upstream_error(resp)
 
             self.__logger.error(
                 HTTPErrorException(
@@ -551,45 +1256,93 @@ class PyGDTelebot:
                 )
             )
 
-    def __linkdownloader(self, link: str):
+    async def __media_info(self, shortcode: str) -> Any:
+        url = f"{self.__ig_base_url}/api/v1/media/{shortcode_to_media_id(shortcode)}/info/"
+
+        self.__logger.info(f"Make a request to the URL Instagram Media Info of {shortcode} using the GET method.")
+
+        resp = await self.__session.request(
+            method="GET",
+            url=url,
+            headers=self.__api_headers(),
+            timeout=60,
+            limiter=self.__limiters.get("instagram_api"),
+            retries=self.__retries
+        )
+        if resp.status_code == 200:
+            return extract_records(json_loads(resp.content).get("items", []))
+
+        HTTP_ERRORS.inc(upstream="instagram_api", status=resp.status_code)
+        self.__logger.error(
+            HTTPErrorException(
+                f"Error! status code {resp.status_code} : {resp.reason}"
+            )
+        )
+
+    async def __linkdownloader(self, link: str, quality: str = "original"):
+        """Yield the media urls of a post link.
+
+        The shortcode of the link is resolved through the Instagram API with the
+        bot's cookie, and igdownloader.app is only scraped when that fails.
+        """
+        shortcode = shortcode_from_link(link)
+
+        if shortcode and self.__cookie:
+            try:
+                records = await self.__media_info(shortcode)
+            except Exception as e:
+                records = None
+                self.__logger.error(e)
+
+            if records:
+                for record in records:
+                    yield pick_url(record, quality)
+                return
+
+            self.__logger.info(f"Falling back to igdownloader.app for {shortcode}.")
+
+        async for media in self.__igdownloader_app(link):
+            yield media
+
+    async def __igdownloader_app(self, link: str):
         self.__logger.info("Retrieve the url from the igdownloader.app API url.")
 
         link = quote(link)
 
-        user_agent = self.__fake.user_agent()
-
         url = f"https://v3.igdownloader.app/api/ajaxSearch?recaptchaToken=&q={link}&t=media&lang=id"
 
-        self.__headers["User-Agent"] = user_agent
+        headers = dict(self.__headers)
+        headers["User-Agent"] = self.__user_agents.get()
 
         self.__logger.info("Make a request to the URL igdownloader.app using the POST method.")
 
-        resp = self.__session.request(
+        resp = await self.__session.request(
             method="POST",
             url=url,
-            headers=self.__headers,
-            timeout=60
+            headers=headers,
+            timeout=60,
+            limiter=self.__limiters.get("igdownloader"),
+            retries=self.__retries
         )
         status_code = resp.status_code
         content = resp.content
         if status_code == 200:
-            response = content.decode('utf-8')
-            data = json.loads(response)
+            data = json_loads(content)
             html = data.get("data", "")
 
-            div = self.__parser.pyq_parser(
+            medias = self.__parser.attr_parser(
                 html,
-                'ul[class="download-box"] li div[class="download-items"] div[class="download-items__btn"]'
+                'ul[class="download-box"] li div[class="download-items"] div[class="download-items__btn"] a',
+                "href"
             )
 
-            for a in div:
-                media = self.__parser.pyq_parser(a, 'a').attr("href")
+            for media in medias:
                 yield media
 
             self.__logger.info("The process of retrieving media has been successful.")
         else:
-            self.__http_error_status_code = resp.status_code
-            self.__http_error_reason = resp.reason
+            HTTP_ERRORS.inc(upstream="igdownloader", status=resp.status_code)
+            self.__upstream_error(resp)
 
             self.__logger.error(
                 HTTPErrorException(
@@ -597,9 +1350,124 @@ class PyGDTelebot:
                 )
             )
 
+    def __recover(self):
+        """Resubmit the jobs journaled as running when the process last stopped.
+
+        Feed jobs with journaled progress carry on from their last acknowledged
+        album and link jobs start over. Stopped jobs only get their session back
+        and wait for the chat to answer whether to continue. With a shared job
+        queue, running jobs are requeued by the queue itself instead.
+        """
+        if not isinstance(self.__scheduler, JobScheduler): return
+
+        resumed = 0
+        for entry in self.__journal.entries():
+            if entry["session"]: self.__restore(entry)
+            if entry["is_stop"]: continue
+
+            if entry["kind"] == "feed" and entry["session"]:
+                job = Job(chat_id=entry["chat_id"], kind="resume", params={}, priority=entry["priority"], label=entry["label"])
+            else:
+                job = Job(
+                    chat_id=entry["chat_id"],
+                    kind=entry["kind"],
+                    params=entry["params"],
+                    priority=entry["priority"],
+                    label=entry["label"]
+                )
+            self.__scheduler.submit(job)
+            resumed += 1
+
+        if resumed: self.__logger.info(f"Resumed {resumed} interrupted job(s) from the delivery journal.")
+
     async def start_polling(self):
         self.__logger.info("Starting the PyGDTelebot program has gone well.")
-        await self.__bot.polling(non_stop=False, timeout=240)
+        try:
+            self.__user_agents.start()
+            self.__recover()
+            if self.__metrics: await self.__metrics.start()
+            # A webhook left by an earlier webhook mode run makes getUpdates fail with 409.
+            await self.__bot.delete_webhook()
+            await self.__bot.polling(non_stop=False, timeout=240)
+        finally:
+            await self.__scheduler.close()
+            await self.__session.close()
+            self.__recompressor.close()
+            if self.__metrics: await self.__metrics.stop()
+
+    async def __process_update(self, update: dict):
+        await self.__bot.process_new_updates([types.Update.de_json(update)])
+
+    async def start_webhook(self):
+        """Receive updates through a webhook instead of long polling.
+
+        The webhook is registered at ``WEBHOOK_URL`` with ``WEBHOOK_SECRET`` as the
+        secret token, and updates are served on ``WEBHOOK_HOST``:``WEBHOOK_PORT``.
+        Both ``WEBHOOK_URL`` and ``WEBHOOK_SECRET`` are required.
+        """
+        from PyGDBot.webhook import WebhookServer
+
+        url = os.environ.get("WEBHOOK_URL")
+        secret_token = os.environ.get("WEBHOOK_SECRET")
+        if not url or not secret_token:
+            raise RuntimeError("Webhook mode needs WEBHOOK_URL and WEBHOOK_SECRET to be set.")
+
+        server = WebhookServer(
+            dispatch=self.__process_update,
+            secret_token=secret_token,
+            host=os.environ.get("WEBHOOK_HOST", "0.0.0.0"),
+            port=int(os.environ.get("WEBHOOK_PORT", 8443)),
+            path=os.environ.get("WEBHOOK_PATH", "/webhook"),
+            queue_size=int(os.environ.get("UPDATE_QUEUE_SIZE", 1000)),
+            workers=int(os.environ.get("UPDATE_WORKERS", 8))
+        )
+
+        self.__logger.info("Starting the PyGDTelebot program in webhook mode.")
+        try:
+            self.__user_agents.start()
+            self.__recover()
+            if self.__metrics: await self.__metrics.start()
+            # Telegram posts updates as soon as the webhook is set, so it is set once the server listens.
+            await server.serve_forever(
+                on_start=lambda: self.__bot.set_webhook(
+                    url=url,
+                    secret_token=secret_token,
+                    max_connections=int(os.environ.get("WEBHOOK_MAX_CONNECTIONS", 40))
+                )
+            )
+        finally:
+            await self.__scheduler.close()
+            await self.__session.close()
+            self.__recompressor.close()
+            if self.__metrics: await self.__metrics.stop()
+            await self.__bot.close_session()
+
+    async def run_worker(self):
+        """Run jobs from the shared ``JOB_QUEUE_DB`` queue until SIGINT or SIGTERM.
+
+        Jobs still running on shutdown go back to the queue for another worker.
+        """
+        if not isinstance(self.__scheduler, SQLiteJobScheduler):
+            raise RuntimeError("Worker processes need JOB_QUEUE_DB to be set.")
+
+        loop = asyncio.get_running_loop()
+        task = asyncio.current_task()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, task.cancel)
+
+        self.__logger.info(f"Starting a PyGDTelebot worker process ({os.getpid()}).")
+        try:
+            self.__user_agents.start()
+            if self.__metrics: await self.__metrics.start()
+            await self.__scheduler.run()
+        except asyncio.CancelledError:
+            pass
+        finally:
+            await self.__scheduler.close()
+            await self.__session.close()
+            self.__recompressor.close()
+            if self.__metrics: await self.__metrics.stop()
+            await self.__bot.close_session()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,187 @@
+import os
+import json
+import time
+import sqlite3
+import asyncio
+import logging
+
+from typing import Any, Awaitable, Callable
+from PyGDBot.scheduler import Job
+
+
+class SQLiteJobScheduler:
+    """Job queue shared by several processes through a SQLite database.
+
+    It has the same interface as ``JobScheduler``. The update intake process
+    only submits, cancels and inspects jobs, and worker processes call ``run``
+    to claim and execute them. Claiming keeps the same fairness rules: a chat
+    runs at most one job at a time, the chat served least recently goes next,
+    and priority only orders the jobs of a chat. A job whose worker stopped
+    sending heartbeats is put back in the queue, and finished or cancelled jobs
+    are deleted so the table only holds pending work.
+    """
+
+    STALE_AFTER = 60
+
+    def __init__(
+        self,
+        runner: Callable[[Job], Awaitable[Any]] | None = None,
+        path: str = "jobs.db",
+        workers: int = 4,
+        poll_interval: float = 0.5
+    ) -> None:
+        self.__runner = runner
+        self.__size = workers
+        self.__poll_interval = poll_interval
+        self.__worker_id = f"{os.getpid()}"
+        self.__running = dict()
+        self.__tasks = []
+        self.__logger = logging.getLogger(self.__class__.__name__)
+
+        self.__conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False, timeout=30)
+        self.__conn.execute("PRAGMA journal_mode=WAL")
+        self.__conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, chat_id INTEGER NOT NULL, kind TEXT NOT NULL, "
+            "params TEXT NOT NULL, priority INTEGER NOT NULL DEFAULT 0, label TEXT NOT NULL, "
+            "state TEXT NOT NULL DEFAULT 'queued', worker TEXT, done INTEGER NOT NULL DEFAULT 0, "
+            "total INTEGER NOT NULL DEFAULT 0, created REAL NOT NULL, started REAL, heartbeat REAL)"
+        )
+        self.__conn.execute("CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, chat_id)")
+        # When each chat last had a job started, kept apart so finished jobs can be deleted.
+        self.__conn.execute(
+            "CREATE TABLE IF NOT EXISTS chats (chat_id INTEGER PRIMARY KEY, served REAL NOT NULL) WITHOUT ROWID"
+        )
+        self.__conn.execute("DELETE FROM jobs WHERE state NOT IN ('queued', 'running')")
+
+    @staticmethod
+    def __job(row: tuple) -> Job:
+        id, chat_id, kind, params, priority, label, done, total = row
+        job = Job(chat_id=chat_id, kind=kind, params=json.loads(params), priority=priority, label=label)
+        job.id, job.done, job.total = id, done, total
+        return job
+
+    def submit(self, job: Job) -> int:
+        self.__conn.execute(
+            "INSERT INTO jobs (chat_id, kind, params, priority, label, created) VALUES (?, ?, ?, ?, ?, ?)",
+            (job.chat_id, job.kind, json.dumps(job.params), job.priority, job.label, time.time())
+        )
+        return self.__conn.execute(
+            "SELECT COUNT(*) FROM jobs WHERE chat_id = ? AND state = 'queued'", (job.chat_id,)
+        ).fetchone()[0]
+
+    def cancel(self, chat_id: int) -> int:
+        return self.__conn.execute(
+            "DELETE FROM jobs WHERE chat_id = ? AND state = 'queued'", (chat_id,)
+        ).rowcount
+
+    def current(self, chat_id: int) -> Job | None:
+        return self.__running.get(chat_id)
+
+    def status(self, chat_id: int) -> dict:
+        running = self.__conn.execute(
+            "SELECT id, chat_id, kind, params, priority, label, done, total FROM jobs "
+            "WHERE chat_id = ? AND state = 'running'", (chat_id,)
+        ).fetchone()
+        queued, total_queued, total_running = self.__conn.execute(
+            "SELECT SUM(chat_id = ? AND state = 'queued'), SUM(state = 'queued'), SUM(state = 'running') "
+            "FROM jobs WHERE state IN ('queued', 'running')", (chat_id,)
+        ).fetchone()
+
+        return {
+            "queued": queued or 0,
+            "running": self.__job(running) if running else None,
+            "total_queued": total_queued or 0,
+            "total_running": total_running or 0,
+            "workers": self.__size,
+        }
+
+    def __claim(self) -> Job | None:
+        now = time.time()
+
+        self.__conn.execute("BEGIN IMMEDIATE")
+        try:
+            self.__conn.execute(
+                "UPDATE jobs SET state = 'queued', worker = NULL WHERE state = 'running' AND heartbeat < ?",
+                (now - self.STALE_AFTER,)
+            )
+            row = self.__conn.execute(
+                "SELECT j.id, j.chat_id, j.kind, j.params, j.priority, j.label, j.done, j.total, j.started FROM jobs j "
+                "LEFT JOIN chats c ON c.chat_id = j.chat_id "
+                "WHERE j.state = 'queued' AND j.chat_id NOT IN (SELECT chat_id FROM jobs WHERE state = 'running') "
+                "ORDER BY COALESCE(c.served, 0) ASC, "
+                "(SELECT MIN(q.id) FROM jobs q WHERE q.state = 'queued' AND q.chat_id = j.chat_id) ASC, "
+                "j.priority DESC, j.id ASC "
+                "LIMIT 1"
+            ).fetchone()
+
+            if row is not None:
+                self.__conn.execute(
+                    "UPDATE jobs SET state = 'running', worker = ?, started = ?, heartbeat = ? WHERE id = ?",
+                    (self.__worker_id, now, now, row[0])
+                )
+                self.__conn.execute(
+                    "INSERT INTO chats (chat_id, served) VALUES (?, ?) "
+                    "ON CONFLICT(chat_id) DO UPDATE SET served = excluded.served",
+                    (row[1], now)
+                )
+            self.__conn.execute("COMMIT")
+        except BaseException:
+            self.__conn.execute("ROLLBACK")
+            raise
+
+        if row is None:
+            return None
+
+        job = self.__job(row[:-1])
+        job.resumed = row[-1] is not None
+        return job
+
+    def __finish(self, job: Job) -> None:
+        self.__conn.execute("DELETE FROM jobs WHERE id = ?", (job.id,))
+
+    async def __heartbeat(self) -> None:
+        while True:
+            now = time.time()
+            for job in list(self.__running.values()):
+                self.__conn.execute(
+                    "UPDATE jobs SET done = ?, total = ?, heartbeat = ? WHERE id = ?",
+                    (job.done, job.total, now, job.id)
+                )
+            await asyncio.sleep(min(5, self.STALE_AFTER / 4))
+
+    async def __worker(self) -> None:
+        while True:
+            job = self.__claim()
+            if job is None:
+                await asyncio.sleep(self.__poll_interval)
+                continue
+
+            self.__running[job.chat_id] = job
+            job.state = "running"
+            try:
+                await self.__runner(job)
+                self.__finish(job)
+            except asyncio.CancelledError:
+                self.__conn.execute("UPDATE jobs SET state = 'queued', worker = NULL WHERE id = ?", (job.id,))
+                raise
+            except Exception as e:
+                self.__finish(job)
+                self.__logger.error(f"Job {job.id} ({job.label}) of chat {job.chat_id} failed : {e}")
+            finally:
+                self.__running.pop(job.chat_id, None)
+
+    async def run(self) -> None:
+        """Claim and run jobs with ``workers`` concurrent tasks until cancelled."""
+        self.__tasks = [asyncio.create_task(self.__worker()) for _ in range(self.__size)]
+        self.__tasks.append(asyncio.create_task(self.__heartbeat()))
+        try:
+            await asyncio.gather(*self.__tasks)
+        finally:
+            await self.close()
+
+    async def close(self) -> None:
+        for task in self.__tasks:
+            task.cancel()
+        await asyncio.gather(*self.__tasks, return_exceptions=True)
+        self.__tasks = []
@@ -0,0 +1,73 @@
+import json
+import time
+import sqlite3
+
+
+class DeliveryJournal:
+    """Running job of each chat and its delivery progress, persisted in SQLite.
+
+    A row is written when a job starts and removed when it ends. While it runs,
+    the session is saved after every acknowledged album, so the pending media,
+    the bytes sent and the ``next_max_id`` cursor survive a restart, and the
+    job can carry on from the last album Telegram accepted. Rows of stopped
+    jobs are kept until the chat answers whether to continue.
+    """
+
+    def __init__(self, path: str = "journal.db") -> None:
+        self.__conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self.__conn.execute("PRAGMA journal_mode=WAL")
+        self.__conn.execute(
+            "CREATE TABLE IF NOT EXISTS journal ("
+            "chat_id INTEGER PRIMARY KEY, kind TEXT NOT NULL, params TEXT NOT NULL, "
+            "priority INTEGER NOT NULL, label TEXT NOT NULL, session TEXT, "
+            "is_stop INTEGER NOT NULL DEFAULT 0, updated REAL NOT NULL)"
+        )
+
+    def begin(self, chat_id: int, kind: str, params: dict, priority: int = 0, label: str = "") -> None:
+        self.__conn.execute(
+            "INSERT OR REPLACE INTO journal (chat_id, kind, params, priority, label, updated) VALUES (?, ?, ?, ?, ?, ?)",
+            (chat_id, kind, json.dumps(params), priority, label, time.time())
+        )
+
+    def save(self, session: dict) -> None:
+        """Record the progress of the running job of ``session["chat_id"]``, if any."""
+        self.__conn.execute(
+            "UPDATE journal SET session = ?, updated = ? WHERE chat_id = ?",
+            (json.dumps(session), time.time(), session["chat_id"])
+        )
+
+    def set_stop(self, chat_id: int, is_stop: bool) -> None:
+        self.__conn.execute(
+            "UPDATE journal SET is_stop = ?, updated = ? WHERE chat_id = ?",
+            (int(is_stop), time.time(), chat_id)
+        )
+
+    def get(self, chat_id: int) -> dict | None:
+        row = self.__conn.execute(
+            "SELECT chat_id, kind, params, priority, label, session, is_stop FROM journal WHERE chat_id = ?",
+            (chat_id,)
+        ).fetchone()
+        return self.__entry(row) if row else None
+
+    def entries(self) -> list:
+        """Every journaled job, oldest progress first."""
+        rows = self.__conn.execute(
+            "SELECT chat_id, kind, params, priority, label, session, is_stop FROM journal ORDER BY updated"
+        ).fetchall()
+        return [self.__entry(row) for row in rows]
+
+    def end(self, chat_id: int) -> None:
+        self.__conn.execute("DELETE FROM journal WHERE chat_id = ?", (chat_id,))
+
+    @staticmethod
+    def __entry(row: tuple) -> dict:
+        chat_id, kind, params, priority, label, session, is_stop = row
+        return {
+            "chat_id": chat_id,
+            "kind": kind,
+            "params": json.loads(params),
+            "priority": priority,
+            "label": label,
+            "session": json.loads(session) if session else None,
+            "is_stop": bool(is_stop),
+        }
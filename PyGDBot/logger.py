@@ -1,22 +1,157 @@
 import os
+import copy
+import json
+import queue
+import atexit
+import random
 import logging.config
+import logging.handlers
+import contextvars
+from contextlib import contextmanager
+from datetime import datetime, timezone
 from configparser import ConfigParser
 
 import yaml
 
 
+LOG_CONTEXT = contextvars.ContextVar("log_context", default={})
+CONTEXT_FIELDS = ("chat_id", "job_id", "stage")
+
+_listener = None
+
+
+@contextmanager
+def log_context(**fields):
+    """Attach ``fields`` (chat_id, job_id, stage) to every record logged inside the block.
+
+    Tasks created inside the block inherit the fields, so downloads started for
+    a job are logged with its chat and job ids.
+    """
+    token = LOG_CONTEXT.set({**LOG_CONTEXT.get(), **fields})
+    try:
+        yield
+    finally:
+        LOG_CONTEXT.reset(token)
+
+
+class ContextFilter(logging.Filter):
+    """Copy the current log context onto the record, "-" for missing fields."""
+
+    def filter(self, record):
+        context = LOG_CONTEXT.get()
+        for field in CONTEXT_FIELDS:
+            if not hasattr(record, field):
+                setattr(record, field, context.get(field, "-"))
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keep only a ``rate`` fraction of the records below ``level``, e.g. per-media debug lines."""
+
+    def __init__(self, rate=0.1, level="INFO"):
+        super().__init__()
+        self.rate = float(rate)
+        self.level = logging.getLevelName(level) if isinstance(level, str) else level
+
+    def filter(self, record):
+        return record.levelno >= self.level or random.random() < self.rate
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with the log context as fields."""
+
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "line": record.lineno,
+            "message": record.getMessage(),
+        }
+        for field in CONTEXT_FIELDS:
+            value = getattr(record, field, "-")
+            if value != "-": entry[field] = value
+
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class TracebackQueueHandler(logging.handlers.QueueHandler):
+    """``QueueHandler`` keeping the traceback in ``exc_text`` instead of folding it into the message.
+
+    The listener's formatters then still see the message and the traceback apart,
+    e.g. for the "exc" field of ``JsonFormatter``.
+    """
+
+    def prepare(self, record):
+        exc_text = record.exc_text
+        if record.exc_info and not exc_text:
+            exc_text = logging.Formatter().formatException(record.exc_info)
+
+        record = copy.copy(record)
+        record.exc_info = None
+        record.exc_text = None
+
+        record = super().prepare(record)
+        record.exc_text = exc_text
+        return record
+
+
+def _start_queue(root):
+    """Move the root handlers behind a QueueHandler drained by a background listener.
+
+    Formatting and file writes then happen on the listener thread, and logging
+    from the event loop only enqueues the record.
+    """
+    global _listener
+
+    handlers = list(root.handlers)
+    for handler in handlers:
+        root.removeHandler(handler)
+
+    records = queue.SimpleQueue()
+    # The log context is read on the caller's thread, before the record is queued.
+    queue_handler = TracebackQueueHandler(records)
+    queue_handler.addFilter(ContextFilter())
+    root.addHandler(queue_handler)
+
+    _listener = logging.handlers.QueueListener(records, *handlers, respect_handler_level=True)
+    _listener.start()
+    atexit.register(stop_logging)
+
+
+def stop_logging():
+    """Flush and stop the background listener, if logging runs through a queue."""
+    global _listener
+
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
 def setup_logging(
     default_path="logging.yaml",
     default_level=logging.INFO,
     env_key="LOG_CFG",
     log_section=None,
 ):
-    """Setup logging configuration"""
+    """Setup logging configuration
+
+    With ``queue: true`` in the configuration, records are handed to the root
+    handlers by a background thread instead of being written from the caller.
+    ``LOG_FILE_SUFFIX`` is inserted before the extension of every log file, so
+    processes running side by side never rotate the same file.
+    """
     path = default_path
     value = os.getenv(env_key, None)
     configparser = ConfigParser()
     configparser.read("config.ini")
     
+    stop_logging()
+
     if value: path = value
     if os.path.exists(path):
         
@@ -41,6 +176,21 @@ def setup_logging(
                 config.get("handlers", {}).get("error_file_handler", {})["filename"] = error_file_name
                 config.get("handlers", {}).get("debug_file_handler", {})["filename"] = debug_file_name
 
+        suffix = os.getenv("LOG_FILE_SUFFIX")
+        if suffix:
+            for handler in config.get("handlers", {}).values():
+                if "filename" in handler:
+                    name, ext = os.path.splitext(handler["filename"])
+                    handler["filename"] = f"{name}.{suffix}{ext}"
+
+        use_queue = config.pop("queue", False)
         logging.config.dictConfig(config)
+
+        root = logging.getLogger()
+        if use_queue:
+            _start_queue(root)
+        else:
+            for handler in root.handlers:
+                handler.addFilter(ContextFilter())
     else:
         logging.basicConfig(level=default_level)
@@ -0,0 +1,137 @@
+import re
+import json
+
+from typing import NamedTuple, Iterable
+
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    json_loads = json.loads
+
+
+IMAGE = "image"
+VIDEO = "video"
+
+# Shortest side of the rendition picked for each quality setting, None keeps the original.
+QUALITIES = {"original": None, "1080p": 1080, "720p": 720, "480p": 480}
+
+SHORTCODE_ALPHABET = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_"
+SHORTCODE_PATTERN = re.compile(r'instagram\.com\/(?:[^\/?]+\/)?(?:p|reels?|tv)\/([A-Za-z0-9_-]+)')
+# CDN urls are signed until the unix time written in hex in their ``oe`` parameter.
+EXPIRY_PATTERN = re.compile(r'[?&]oe=([0-9A-Fa-f]+)')
+
+
+class MediaRecord(NamedTuple):
+    """A single photo or video of an Instagram post.
+
+    ``size_hint`` is the pixel area of the chosen rendition, a cheap proxy for
+    its size in bytes. ``variants`` lists every rendition as ``(width, height,
+    url)``, largest first. ``post_id`` is the id of the post holding the media,
+    the same for every child of a carousel, and ``expires`` the unix time the
+    signature of ``url`` runs out, when the url carries one.
+    """
+
+    id: str
+    kind: str
+    url: str
+    width: int
+    height: int
+    size_hint: int
+    variants: tuple = ()
+    post_id: str = ""
+    expires: int | None = None
+
+
+def _area(version: dict) -> int:
+    return version.get("width", 0) * version.get("height", 0)
+
+
+def extract_records(items: Iterable[dict]) -> list[MediaRecord]:
+    """Walk feed items once and return one record per media, in post order.
+
+    Carousel children are expanded in place. A video keeps only its best video
+    rendition, never its cover image.
+    """
+    records = []
+    append = records.append
+
+    for item in items:
+        post_id = str(item.get("pk") or item.get("id") or "").split("_")[0]
+
+        for media in item.get("carousel_media") or (item,):
+            versions = media.get("video_versions")
+            kind = VIDEO
+
+            if not versions:
+                versions = media.get("image_versions2", {}).get("candidates")
+                kind = IMAGE
+                if not versions: continue
+
+            versions = sorted(versions, key=_area, reverse=True)
+            best = versions[0]
+            width = best.get("width", 0)
+            height = best.get("height", 0)
+
+            append(
+                MediaRecord(
+                    id=str(media.get("id") or media.get("pk")),
+                    kind=kind,
+                    url=best.get("url"),
+                    width=width,
+                    height=height,
+                    size_hint=width * height,
+                    variants=tuple((version.get("width", 0), version.get("height", 0), version.get("url")) for version in versions),
+                    post_id=post_id,
+                    expires=url_expiry(best.get("url"))
+                )
+            )
+
+    return records
+
+
+def pick_url(record: MediaRecord, quality: str = "original") -> str:
+    """Return the url of the largest rendition whose shortest side fits ``quality``."""
+    side = QUALITIES.get(quality)
+    if not side or not record.variants:
+        return record.url
+
+    for width, height, url in record.variants:
+        if min(width, height) <= side:
+            return url
+    return record.variants[-1][2]
+
+
+def url_expiry(url: str | None) -> int | None:
+    """Return the unix time the signature of a CDN ``url`` expires at, None when unsigned."""
+    matches = EXPIRY_PATTERN.search(url or "")
+    if matches:
+        return int(matches.group(1), 16)
+
+
+def shortcode_from_link(link: str) -> str | None:
+    matches = SHORTCODE_PATTERN.search(link)
+    if matches:
+        return matches.group(1)
+
+
+def shortcode_to_media_id(shortcode: str) -> str:
+    """Decode a post shortcode into its numeric media id.
+
+    Shortcodes are the media id in base 64. Private posts append extra
+    characters past the first 11, which are not part of the id.
+    """
+    media_id = 0
+    for char in shortcode[:11]:
+        media_id = media_id * 64 + SHORTCODE_ALPHABET.index(char)
+    return str(media_id)
+
+
+def select_media(records: Iterable[MediaRecord], feature: str) -> list[MediaRecord]:
+    match feature:
+        case "Images":
+            return [record for record in records if record.kind == IMAGE]
+        case "Videos":
+            return [record for record in records if record.kind == VIDEO]
+        case _:
+            return list(records)
@@ -0,0 +1,215 @@
+import time
+import bisect
+import asyncio
+import logging
+import functools
+import threading
+
+from typing import Any, Callable
+
+
+class Metric:
+    """A named family of samples, one per combination of label values.
+
+    ``collect`` may be set to a callable returning ``{label values: value}`` to
+    compute the samples when they are scraped instead of updating them inline.
+    """
+
+    type = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), registry: Any = None) -> None:
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.collect = None
+        self._values = dict()
+        self._lock = threading.Lock()
+        (registry or REGISTRY).register(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _labels(self, key: tuple, extra: str = "") -> str:
+        pairs = [f'{name}="{value}"' for name, value in zip(self.labelnames, key)]
+        if extra: pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def samples(self) -> list:
+        values = self.collect() if self.collect else self._values
+        return [f"{self.name}{self._labels(key)} {value}" for key, value in sorted(values.items())]
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.type}"]
+        return "\n".join(lines + self.samples())
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def inc(self, amount: float = 1, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels) -> None:
+        self.inc(-amount, **labels)
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS, registry: Any = None) -> None:
+        super().__init__(name, documentation, labelnames, registry)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels) -> None:
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * (len(self.buckets) + 1), 0.0))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._values[key] = (counts, total + value)
+
+    def samples(self) -> list:
+        lines = []
+        with self._lock:
+            values = {key: (list(counts), total) for key, (counts, total) in self._values.items()}
+
+        for key, (counts, total) in sorted(values.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                bucket = f'le="{le}"'
+                lines.append(f"{self.name}_bucket{self._labels(key, bucket)} {cumulative}")
+            lines.append(f"{self.name}_sum{self._labels(key)} {total}")
+            lines.append(f"{self.name}_count{self._labels(key)} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self) -> None:
+        self.__metrics = []
+
+    def register(self, metric: Metric) -> None:
+        self.__metrics.append(metric)
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for metric in self.__metrics) + "\n"
+
+
+class timed:
+    """Observe the duration of a block or of every call into ``histogram``.
+
+    Works as a context manager, sync or async, and as a decorator of plain or
+    coroutine functions::
+
+        with timed(STAGE_SECONDS, stage="feed_fetch"): ...
+
+        @timed(STAGE_SECONDS, stage="cdn_download")
+        async def download(...): ...
+    """
+
+    def __init__(self, histogram: Histogram, **labels) -> None:
+        self.__histogram = histogram
+        self.__labels = labels
+        self.__started = []
+
+    def __enter__(self) -> "timed":
+        self.__started.append(time.perf_counter())
+        return self
+
+    def __exit__(self, *exc_info) -> None:
+        self.__histogram.observe(time.perf_counter() - self.__started.pop(), **self.__labels)
+
+    async def __aenter__(self) -> "timed":
+        return self.__enter__()
+
+    async def __aexit__(self, *exc_info) -> None:
+        self.__exit__(*exc_info)
+
+    def __call__(self, func: Callable) -> Callable:
+        histogram, labels = self.__histogram, self.__labels
+
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    histogram.observe(time.perf_counter() - started, **labels)
+        else:
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return func(*args, **kwargs)
+                finally:
+                    histogram.observe(time.perf_counter() - started, **labels)
+
+        return wrapper
+
+
+class MetricsServer:
+    """Serves the registry in the Prometheus text format on ``/metrics``."""
+
+    def __init__(self, registry: Registry | None = None, host: str = "127.0.0.1", port: int = 9100) -> None:
+        self.__registry = registry or REGISTRY
+        self.__host = host
+        self.__port = port
+        self.__runner = None
+        self.__logger = logging.getLogger(self.__class__.__name__)
+
+    async def __handle(self, request: Any) -> Any:
+        from aiohttp import web
+
+        return web.Response(text=self.__registry.render(), content_type="text/plain", charset="utf-8")
+
+    async def start(self) -> None:
+        from aiohttp import web
+
+        app = web.Application()
+        app.router.add_get("/metrics", self.__handle)
+
+        self.__runner = web.AppRunner(app)
+        await self.__runner.setup()
+        await web.TCPSite(self.__runner, host=self.__host, port=self.__port).start()
+        self.__logger.info(f"Metrics served on {self.__host}:{self.__port}/metrics.")
+
+    async def stop(self) -> None:
+        if self.__runner is not None:
+            await self.__runner.cleanup()
+            self.__runner = None
+
+
+REGISTRY = Registry()
+
+STAGE_SECONDS = Histogram("pygd_stage_seconds", "Latency of each delivery stage.", ("stage",))
+BYTES = Counter("pygd_bytes_total", "Media bytes downloaded from the CDN and uploaded to Telegram.", ("direction",))
+CACHE_REQUESTS = Counter("pygd_cache_requests_total", "Media cache lookups by cache and result.", ("cache", "result"))
+FEED_CACHE = Counter("pygd_feed_cache_total", "Feed page cache lookups by result.", ("result",))
+HTTP_ERRORS = Counter("pygd_http_errors_total", "Failed upstream calls by status code.", ("upstream", "status"))
+JOBS = Gauge("pygd_jobs", "Jobs by state across every chat.", ("state",))
+SESSIONS_IN_FLIGHT = Gauge("pygd_sessions_in_flight", "Chats with a job running in this process.")
+RATE_LIMIT_TOKENS = Gauge("pygd_rate_limit_tokens", "Tokens left in the rate limiter of each upstream.", ("upstream",))
+RATE_LIMIT_BLOCKED = Gauge(
+    "pygd_rate_limit_blocked_seconds", "Seconds each upstream stays blocked after asking to back off.", ("upstream",)
+)
+RATE_LIMIT_THROTTLED = Counter(
+    "pygd_rate_limit_throttled_total", "Times each upstream asked to back off.", ("upstream",)
+)
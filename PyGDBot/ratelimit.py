@@ -0,0 +1,124 @@
+import os
+import time
+import random
+import asyncio
+import logging
+
+from email.utils import parsedate_to_datetime
+
+
+DEFAULT_RATE_LIMITS = "instagram_api=0.5:3,instagram_cdn=20:40,igdownloader=1:2,telegram=20:30"
+
+
+def backoff_delay(attempt: int, base: float = 1.0, cap: float = 60.0) -> float:
+    """Exponential backoff with full jitter."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+def parse_retry_after(value: str | int | None) -> float | None:
+    """Parse a ``Retry-After`` value given in seconds or as an HTTP date."""
+    if value is None:
+        return None
+
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        pass
+
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class TokenBucket:
+    """Token bucket refilled at ``rate`` tokens per second up to ``capacity``.
+
+    Waiters are served one at a time in arrival order. ``penalize`` empties the
+    bucket and blocks it for the delay an upstream asked for.
+    """
+
+    def __init__(self, name: str, rate: float, capacity: float) -> None:
+        self.name = name
+        self.rate = rate
+        self.capacity = capacity
+        self.throttled = 0
+        self.__tokens = capacity
+        self.__updated = time.monotonic()
+        self.__blocked_until = 0.0
+        self.__lock = asyncio.Lock()
+
+    def __refill(self) -> float:
+        now = time.monotonic()
+        self.__tokens = min(self.capacity, self.__tokens + (now - self.__updated) * self.rate)
+        self.__updated = now
+        return now
+
+    async def acquire(self, tokens: float = 1) -> None:
+        tokens = min(tokens, self.capacity)
+
+        async with self.__lock:
+            while True:
+                now = self.__refill()
+
+                if now < self.__blocked_until:
+                    await asyncio.sleep(self.__blocked_until - now)
+                    continue
+
+                if self.__tokens >= tokens:
+                    self.__tokens -= tokens
+                    return
+
+                await asyncio.sleep((tokens - self.__tokens) / self.rate)
+
+    def penalize(self, delay: float) -> None:
+        self.__refill()
+        self.throttled += 1
+        self.__tokens = 0
+        self.__blocked_until = max(self.__blocked_until, time.monotonic() + delay)
+
+    def snapshot(self) -> dict:
+        now = self.__refill()
+        return {
+            "rate": self.rate,
+            "capacity": self.capacity,
+            "tokens": round(self.__tokens, 3),
+            "blocked_for": round(max(0.0, self.__blocked_until - now), 3),
+            "throttled": self.throttled,
+        }
+
+
+class RateLimiters:
+    """One ``TokenBucket`` per upstream, configured as ``name=rate:capacity`` pairs.
+
+    The spec comes from the ``RATE_LIMITS`` environment variable, e.g.
+    ``instagram_api=0.5:3,telegram=20:30``; upstreams it leaves out keep their
+    defaults. When ``share`` processes run side by side, each gets an equal
+    share of every budget.
+    """
+
+    def __init__(self, spec: str | None = None, share: int = 1) -> None:
+        share = max(1, share)
+        self.__buckets = dict()
+        self.__logger = logging.getLogger(self.__class__.__name__)
+
+        for part in f"{DEFAULT_RATE_LIMITS},{spec or os.environ.get('RATE_LIMITS', '')}".split(","):
+            if "=" not in part: continue
+
+            name, limits = part.strip().split("=", 1)
+            rate, _, capacity = limits.partition(":")
+            self.__buckets[name] = TokenBucket(
+                name=name,
+                rate=float(rate) / share,
+                capacity=max(1.0, float(capacity or rate) / share)
+            )
+
+    def get(self, name: str) -> TokenBucket:
+        return self.__buckets[name]
+
+    def penalize(self, name: str, delay: float) -> None:
+        self.__buckets[name].penalize(delay)
+        self.__logger.warning(f"{name} is rate limited, waiting {delay:.1f}s : {self.snapshot()}")
+
+    def snapshot(self) -> dict:
+        return {name: bucket.snapshot() for name, bucket in self.__buckets.items()}
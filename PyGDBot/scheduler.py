@@ -0,0 +1,136 @@
+import time
+import heapq
+import asyncio
+import logging
+import itertools
+import contextvars
+
+from collections import deque
+from typing import Any, Awaitable, Callable
+
+
+# Job being run by the current task, inherited by the tasks it starts.
+CURRENT_JOB = contextvars.ContextVar("current_job", default=None)
+
+
+class Job:
+    """A unit of work submitted by a chat, e.g. one username or one post link."""
+
+    __ids = itertools.count(1)
+
+    def __init__(self, chat_id: int, kind: str, params: dict, priority: int = 0, label: str = "") -> None:
+        self.id = next(self.__ids)
+        self.chat_id = chat_id
+        self.kind = kind
+        self.params = params
+        self.priority = priority
+        self.label = label or kind
+        self.state = "queued"
+        self.done = 0
+        self.total = 0
+        self.created = time.time()
+        # Set when the job had already started once, e.g. before a worker died.
+        self.resumed = False
+        # (status code, reason) of the last upstream request of the job that failed.
+        self.error = None
+
+
+class JobScheduler:
+    """Runs queued jobs on a bounded pool of workers with per-chat fair queuing.
+
+    A chat runs at most one job at a time, so jobs of a chat never share its
+    session concurrently. Chats take turns round-robin, and priority only
+    orders the jobs of a chat among themselves, so no chat can jump ahead of
+    another one's turn.
+    """
+
+    def __init__(self, runner: Callable[[Job], Awaitable[Any]], workers: int = 4) -> None:
+        self.__runner = runner
+        self.__size = workers
+        self.__queues = dict()
+        self.__ring = deque()
+        self.__running = dict()
+        self.__workers = []
+        self.__wakeup = asyncio.Event()
+        self.__logger = logging.getLogger(self.__class__.__name__)
+
+    def submit(self, job: Job) -> int:
+        """Queue ``job`` and return how many jobs of its chat are now waiting."""
+        if not self.__workers:
+            self.__workers = [asyncio.create_task(self.__worker()) for _ in range(self.__size)]
+
+        queue = self.__queues.setdefault(job.chat_id, [])
+        if not queue:
+            self.__ring.append(job.chat_id)
+        heapq.heappush(queue, (-job.priority, job.id, job))
+
+        self.__wakeup.set()
+        return len(queue)
+
+    def cancel(self, chat_id: int) -> int:
+        """Drop the queued jobs of ``chat_id`` and return how many were dropped."""
+        queue = self.__queues.pop(chat_id, [])
+        if chat_id in self.__ring:
+            self.__ring.remove(chat_id)
+
+        for _, _, job in queue:
+            job.state = "cancelled"
+        return len(queue)
+
+    def current(self, chat_id: int) -> Job | None:
+        return self.__running.get(chat_id)
+
+    def status(self, chat_id: int) -> dict:
+        return {
+            "queued": len(self.__queues.get(chat_id, [])),
+            "running": self.__running.get(chat_id),
+            "total_queued": sum(len(queue) for queue in self.__queues.values()),
+            "total_running": len(self.__running),
+            "workers": self.__size,
+        }
+
+    def __next_job(self) -> Job | None:
+        for position, chat_id in enumerate(self.__ring):
+            if chat_id not in self.__running: break
+        else:
+            return None
+
+        del self.__ring[position]
+
+        queue = self.__queues[chat_id]
+        _, _, job = heapq.heappop(queue)
+        if queue:
+            self.__ring.append(chat_id)
+        else:
+            del self.__queues[chat_id]
+
+        return job
+
+    async def __worker(self) -> None:
+        while True:
+            job = self.__next_job()
+            if job is None:
+                self.__wakeup.clear()
+                await self.__wakeup.wait()
+                continue
+
+            self.__running[job.chat_id] = job
+            job.state = "running"
+            try:
+                await self.__runner(job)
+                job.state = "done"
+            except asyncio.CancelledError:
+                job.state = "cancelled"
+                raise
+            except Exception as e:
+                job.state = "failed"
+                self.__logger.error(f"Job {job.id} ({job.label}) of chat {job.chat_id} failed : {e}")
+            finally:
+                self.__running.pop(job.chat_id, None)
+                self.__wakeup.set()
+
+    async def close(self) -> None:
+        for worker in self.__workers:
+            worker.cancel()
+        await asyncio.gather(*self.__workers, return_exceptions=True)
+        self.__workers = []
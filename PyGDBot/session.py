@@ -0,0 +1,214 @@
+import os
+import json
+import time
+import sqlite3
+
+from collections import OrderedDict
+from typing import Any
+
+
+class ChatSession:
+    """Conversation state of a single Telegram chat."""
+
+    def __init__(
+        self,
+        chat_id: int,
+        func_name: str | None = None,
+        medias: list | None = None,
+        next_max_id: str | None = None,
+        is_stop: bool = False,
+        is_click: int = 0,
+        message_id: int | None = None,
+        msg_text: str = "",
+        username: str | None = None,
+        profile_mode: bool = False,
+        pages_left: int | None = None,
+        byte_budget: int | None = None,
+        bytes_sent: int = 0,
+        quality: str = "original",
+        only_new: bool = False,
+        page_max_id: str | None = None,
+    ) -> None:
+        self.chat_id = chat_id
+        self.func_name = func_name
+        self.medias = medias if medias is not None else []
+        self.next_max_id = next_max_id
+        self.is_stop = is_stop
+        self.is_click = is_click
+        self.message_id = message_id
+        self.msg_text = msg_text
+        self.username = username
+        self.profile_mode = profile_mode
+        self.pages_left = pages_left
+        self.byte_budget = byte_budget
+        self.bytes_sent = bytes_sent
+        self.quality = quality
+        self.only_new = only_new
+        # Cursor of the feed page ``medias`` came from, to sign their urls again.
+        self.page_max_id = page_max_id
+
+    def to_dict(self) -> dict:
+        return dict(vars(self))
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "ChatSession":
+        return cls(**data)
+
+
+class SessionStore:
+    """In-memory session store keyed by ``chat.id``.
+
+    Sessions untouched for ``ttl`` seconds are evicted, and at most ``max_size``
+    sessions are kept, dropping the least recently used ones first.
+    """
+
+    # Fields a running job owns, written back by ``save_progress`` after every album.
+    PROGRESS_FIELDS = ("medias", "next_max_id", "page_max_id", "bytes_sent", "pages_left")
+
+    def __init__(self, ttl: int = 3600, max_size: int = 10000) -> None:
+        self._ttl = ttl
+        self._max_size = max_size
+        self.__sessions = OrderedDict()
+
+    def get(self, chat_id: int) -> ChatSession:
+        self.evict()
+
+        entry = self.__sessions.pop(chat_id, None)
+        session = entry[0] if entry else ChatSession(chat_id=chat_id)
+        self.__sessions[chat_id] = (session, time.monotonic())
+        return session
+
+    def save(self, session: ChatSession) -> None:
+        self.__sessions.pop(session.chat_id, None)
+        self.__sessions[session.chat_id] = (session, time.monotonic())
+
+    def save_progress(self, session: ChatSession) -> ChatSession:
+        """Save only the ``PROGRESS_FIELDS`` of ``session`` and return the stored session.
+
+        The other fields keep the value in the store, so a job does not undo a
+        /quality or a feature picked while it was running.
+        """
+        stored = self.get(session.chat_id)
+        for field in self.PROGRESS_FIELDS:
+            setattr(stored, field, getattr(session, field))
+        self.save(stored)
+        return stored
+
+    def set_stop(self, chat_id: int, is_stop: bool) -> None:
+        session = self.get(chat_id)
+        session.is_stop = is_stop
+
+    def is_stopped(self, chat_id: int) -> bool:
+        return self.get(chat_id).is_stop
+
+    def drop(self, chat_id: int) -> None:
+        self.__sessions.pop(chat_id, None)
+
+    def evict(self) -> None:
+        deadline = time.monotonic() - self._ttl
+
+        while self.__sessions:
+            chat_id, (_, touched) = next(iter(self.__sessions.items()))
+            if touched >= deadline and len(self.__sessions) <= self._max_size:
+                break
+            self.__sessions.pop(chat_id)
+
+    def __len__(self) -> int:
+        return len(self.__sessions)
+
+
+class SQLiteSessionStore(SessionStore):
+    """Session store persisted in SQLite.
+
+    ``get`` always returns a fresh copy, so callers must ``save`` after changing
+    it. The stop flag lives in its own column and is only written by
+    ``set_stop``, so saving a session never overwrites a concurrent /stop.
+    """
+
+    def __init__(self, path: str = "sessions.db", ttl: int = 3600, max_size: int = 10000) -> None:
+        super().__init__(ttl=ttl, max_size=max_size)
+        self.__conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self.__conn.execute("PRAGMA journal_mode=WAL")
+        self.__conn.execute(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            "chat_id INTEGER PRIMARY KEY, data TEXT NOT NULL, "
+            "is_stop INTEGER NOT NULL DEFAULT 0, touched REAL NOT NULL)"
+        )
+        self.__last_evict = 0.0
+
+    def get(self, chat_id: int) -> ChatSession:
+        self.evict()
+
+        row = self.__conn.execute(
+            "SELECT data, is_stop FROM sessions WHERE chat_id = ?", (chat_id,)
+        ).fetchone()
+        if row is None:
+            session = ChatSession(chat_id=chat_id)
+            self.save(session)
+            return session
+
+        session = ChatSession.from_dict(json.loads(row[0]))
+        session.is_stop = bool(row[1])
+        return session
+
+    def save(self, session: ChatSession) -> None:
+        data = session.to_dict()
+        data.pop("is_stop")
+
+        self.__conn.execute(
+            "INSERT INTO sessions (chat_id, data, touched) VALUES (?, ?, ?) "
+            "ON CONFLICT(chat_id) DO UPDATE SET data = excluded.data, touched = excluded.touched",
+            (session.chat_id, json.dumps(data), time.time())
+        )
+
+    def save_progress(self, session: ChatSession) -> ChatSession:
+        self.__conn.execute("BEGIN IMMEDIATE")
+        try:
+            stored = super().save_progress(session)
+            self.__conn.execute("COMMIT")
+        except BaseException:
+            self.__conn.execute("ROLLBACK")
+            raise
+        return stored
+
+    def set_stop(self, chat_id: int, is_stop: bool) -> None:
+        self.get(chat_id)
+        self.__conn.execute(
+            "UPDATE sessions SET is_stop = ?, touched = ? WHERE chat_id = ?",
+            (int(is_stop), time.time(), chat_id)
+        )
+
+    def is_stopped(self, chat_id: int) -> bool:
+        row = self.__conn.execute("SELECT is_stop FROM sessions WHERE chat_id = ?", (chat_id,)).fetchone()
+        return bool(row and row[0])
+
+    def drop(self, chat_id: int) -> None:
+        self.__conn.execute("DELETE FROM sessions WHERE chat_id = ?", (chat_id,))
+
+    def evict(self) -> None:
+        now = time.time()
+        if now - self.__last_evict < 60:
+            return
+        self.__last_evict = now
+
+        self.__conn.execute("DELETE FROM sessions WHERE touched < ?", (now - self._ttl,))
+        self.__conn.execute(
+            "DELETE FROM sessions WHERE chat_id NOT IN "
+            "(SELECT chat_id FROM sessions ORDER BY touched DESC LIMIT ?)",
+            (self._max_size,)
+        )
+
+    def __len__(self) -> int:
+        return self.__conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+
+def create_session_store() -> Any:
+    """Build the session store selected by the ``SESSION_BACKEND`` environment variable."""
+    ttl = int(os.environ.get("SESSION_TTL", 3600))
+    max_size = int(os.environ.get("SESSION_MAX_SIZE", 10000))
+
+    match os.environ.get("SESSION_BACKEND", "memory"):
+        case "sqlite":
+            return SQLiteSessionStore(path=os.environ.get("SESSION_DB", "sessions.db"), ttl=ttl, max_size=max_size)
+        case _:
+            return SessionStore(ttl=ttl, max_size=max_size)
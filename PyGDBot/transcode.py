@@ -0,0 +1,91 @@
+import io
+import asyncio
+import logging
+import importlib.util
+
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any
+from PyGDBot.http_client import SpooledMedia
+
+
+def downscale_jpeg(data: bytes, side: int, quality: int) -> bytes | None:
+    """Shrink a JPEG so its shortest side is ``side`` pixels, or return None if it already fits.
+
+    Runs in a worker process, so it only takes and returns bytes. Pillow is
+    imported there, never by the bot process itself.
+    """
+    from PIL import Image
+
+    with Image.open(io.BytesIO(data)) as image:
+        if min(image.size) <= side:
+            return None
+
+        scale = side / min(image.size)
+        image = image.convert("RGB").resize(
+            (round(image.width * scale), round(image.height * scale)),
+            Image.LANCZOS
+        )
+
+        output = io.BytesIO()
+        image.save(output, format="JPEG", quality=quality, optimize=True)
+        return output.getvalue()
+
+
+class ImageRecompressor:
+    """Downscales images larger than a chat's quality setting in a process pool.
+
+    Decoding and encoding are CPU bound, so they run in ``workers`` processes
+    and never on the event loop. It is a no-op when Pillow is not installed.
+    """
+
+    def __init__(self, workers: int = 2, quality: int = 85, max_size: int = 8 * 1024 * 1024) -> None:
+        self.__workers = workers
+        self.__quality = quality
+        self.__max_size = max_size
+        self.__pool = None
+        self.__pillow = None
+        self.__logger = logging.getLogger(self.__class__.__name__)
+
+    @property
+    def available(self) -> bool:
+        if self.__pillow is None:
+            self.__pillow = importlib.util.find_spec("PIL") is not None
+        return self.__pillow and self.__workers > 0
+
+    async def recompress(self, mediafile: Any, side: int) -> Any:
+        """Return a smaller copy of ``mediafile`` and discard it, or ``mediafile`` itself."""
+        if not self.available:
+            return mediafile
+
+        if self.__pool is None:
+            self.__pool = ProcessPoolExecutor(max_workers=self.__workers)
+
+        mediafile.seek(0)
+        data = mediafile.read()
+        mediafile.seek(0)
+
+        try:
+            smaller = await asyncio.get_running_loop().run_in_executor(
+                self.__pool, downscale_jpeg, data, side, self.__quality
+            )
+        except Exception as e:
+            self.__logger.error(f"Failed to recompress {mediafile.name} : {e}")
+            return mediafile
+
+        if smaller is None or len(smaller) >= len(data):
+            return mediafile
+
+        self.__logger.info(f"Recompressed {mediafile.name} from {len(data)} to {len(smaller)} bytes.")
+
+        recompressed = SpooledMedia(name=mediafile.name, max_size=self.__max_size)
+        recompressed.write(smaller)
+        recompressed.seek(0)
+
+        if hasattr(mediafile, "discard"):
+            mediafile.discard()
+        return recompressed
+
+    def close(self) -> None:
+        if self.__pool is not None:
+            self.__pool.shutdown(wait=False, cancel_futures=True)
+            self.__pool = None
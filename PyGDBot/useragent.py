@@ -0,0 +1,49 @@
+import random
+import asyncio
+import logging
+
+
+DEFAULT_USER_AGENT = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) "
+    "Chrome/124.0.0.0 Safari/537.36"
+)
+
+
+class UserAgentPool:
+    """Browser user agents picked at random for outgoing requests.
+
+    The pool is generated with Faker in a thread once ``start`` is called, so
+    neither startup nor the event loop pays for Faker. Until it is ready,
+    ``get`` answers ``DEFAULT_USER_AGENT``.
+    """
+
+    def __init__(self, size: int = 100) -> None:
+        self.__size = size
+        self.__pool = None
+        self.__future = None
+        self.__logger = logging.getLogger(self.__class__.__name__)
+
+    def start(self) -> None:
+        if self.__pool is not None or self.__future is not None: return
+
+        self.__future = asyncio.get_running_loop().run_in_executor(None, self.__generate, self.__size)
+        self.__future.add_done_callback(self.__ready)
+
+    @staticmethod
+    def __generate(size: int) -> tuple:
+        from faker import Faker
+
+        fake = Faker()
+        return tuple(fake.user_agent() for _ in range(size))
+
+    def __ready(self, future: asyncio.Future) -> None:
+        if future.cancelled(): return
+
+        if future.exception():
+            self.__logger.warning(f"Failed to generate user agents, using the default one : {future.exception()}")
+            return
+
+        self.__pool = future.result()
+
+    def get(self) -> str:
+        return random.choice(self.__pool) if self.__pool else DEFAULT_USER_AGENT
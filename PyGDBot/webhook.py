@@ -0,0 +1,122 @@
+import hmac
+import signal
+import asyncio
+import logging
+
+from aiohttp import web
+from typing import Any, Awaitable, Callable
+
+
+class WebhookServer:
+    """HTTP server receiving Telegram updates and handing them to ``dispatch``.
+
+    Updates go through a bounded queue consumed by ``workers`` tasks. When the
+    queue is full the server answers 503 with ``Retry-After`` so Telegram
+    redelivers the update later, which keeps memory bounded under load. Updates
+    without the secret token are refused with 401. On
+    shutdown the server stops accepting updates and drains the queue before
+    stopping the workers.
+    """
+
+    SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+    def __init__(
+        self,
+        dispatch: Callable[[dict], Awaitable[Any]],
+        secret_token: str,
+        host: str = "0.0.0.0",
+        port: int = 8443,
+        path: str = "/webhook",
+        queue_size: int = 1000,
+        workers: int = 8
+    ) -> None:
+        if not secret_token:
+            raise ValueError("The webhook server needs a secret token.")
+
+        self.__dispatch = dispatch
+        self.__secret_token = secret_token
+        self.__host = host
+        self.__port = port
+        self.__path = path
+        self.__queue = asyncio.Queue(maxsize=queue_size)
+        self.__size = workers
+        self.__workers = []
+        self.__runner = None
+        self.__accepting = False
+        self.__logger = logging.getLogger(self.__class__.__name__)
+
+    async def __handle(self, request: web.Request) -> web.Response:
+        if not hmac.compare_digest(
+            request.headers.get(self.SECRET_HEADER, ""), self.__secret_token
+        ):
+            return web.Response(status=401)
+
+        if not self.__accepting:
+            return web.Response(status=503, headers={"Retry-After": "5"})
+
+        try:
+            update = await request.json()
+        except ValueError:
+            return web.Response(status=400)
+
+        try:
+            self.__queue.put_nowait(update)
+        except asyncio.QueueFull:
+            self.__logger.warning("Update queue is full, asking Telegram to retry later.")
+            return web.Response(status=503, headers={"Retry-After": "1"})
+
+        return web.Response(status=200)
+
+    async def __worker(self) -> None:
+        while True:
+            update = await self.__queue.get()
+            try:
+                await self.__dispatch(update)
+            except Exception as e:
+                self.__logger.error(f"Failed to process update {update.get('update_id')} : {e}")
+            finally:
+                self.__queue.task_done()
+
+    async def start(self) -> None:
+        app = web.Application()
+        app.router.add_post(self.__path, self.__handle)
+
+        self.__runner = web.AppRunner(app)
+        await self.__runner.setup()
+        await web.TCPSite(self.__runner, host=self.__host, port=self.__port).start()
+
+        self.__workers = [asyncio.create_task(self.__worker()) for _ in range(self.__size)]
+        self.__accepting = True
+        self.__logger.info(f"Webhook server listening on {self.__host}:{self.__port}{self.__path}.")
+
+    async def stop(self, timeout: float = 30) -> None:
+        self.__accepting = False
+
+        try:
+            await asyncio.wait_for(self.__queue.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            self.__logger.warning(f"{self.__queue.qsize()} update(s) left undrained after {timeout}s.")
+
+        for worker in self.__workers:
+            worker.cancel()
+        await asyncio.gather(*self.__workers, return_exceptions=True)
+
+        if self.__runner is not None:
+            await self.__runner.cleanup()
+
+    async def serve_forever(self, on_start: Callable[[], Awaitable[Any]] | None = None) -> None:
+        """Serve until SIGINT or SIGTERM, then shut down gracefully.
+
+        ``on_start`` is awaited once the server listens, e.g. to register the webhook.
+        """
+        stopping = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stopping.set)
+
+        await self.start()
+        try:
+            if on_start: await on_start()
+            await stopping.wait()
+        finally:
+            await self.stop()
@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""Benchmark segmented media downloads against a local range-capable server.
+
+The server caps the bandwidth of every connection, like a single TCP stream on
+a high-latency link, and serves one random video body. The same body is then
+downloaded with ``AsyncHttpClient.download`` as a single stream and in HTTP
+ranges, from a server without range support to check the fallback, and with
+connections cut mid-body to check that ranges resume.
+
+    python benchmarks/bench_download.py --size-mb 24 --mbps 40 --segments 4
+"""
+import os
+import re
+import sys
+import time
+import asyncio
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiohttp import web
+from PyGDBot.http_client import AsyncHttpClient
+
+
+CHUNK_SIZE = 64 * 1024
+RANGE = re.compile(r'bytes=(\d+)-(\d*)')
+
+
+class RangeServer:
+    """Serves ``body`` at ``/video.mp4``, ``/plain.mp4`` without ranges and ``/flaky.mp4`` cutting connections."""
+
+    def __init__(self, body: bytes, mbps: float, cut_after: int) -> None:
+        self.body = body
+        self.mbps = mbps
+        self.cut_after = cut_after
+        self.requests = 0
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/{name}.mp4", self.serve)
+        return app
+
+    async def serve(self, request: web.Request) -> web.StreamResponse:
+        self.requests += 1
+        name = request.match_info["name"]
+        start, end, status = 0, len(self.body) - 1, 200
+
+        matches = RANGE.match(request.headers.get("Range", ""))
+        if matches and name != "plain":
+            start = int(matches.group(1))
+            end = min(int(matches.group(2) or end), end)
+            status = 206
+
+        response = web.StreamResponse(status=status, headers={"Content-Type": "video/mp4", "Accept-Ranges": "bytes"})
+        if status == 206:
+            response.headers["Content-Range"] = f"bytes {start}-{end}/{len(self.body)}"
+        response.content_length = end - start + 1
+        await response.prepare(request)
+
+        sent = 0
+        for offset in range(start, end + 1, CHUNK_SIZE):
+            if name == "flaky" and sent >= self.cut_after:
+                request.transport.close()
+                return response
+
+            chunk = self.body[offset:min(offset + CHUNK_SIZE, end + 1)]
+            await response.write(chunk)
+            sent += len(chunk)
+            await asyncio.sleep(len(chunk) / (self.mbps * 125000))
+        await response.write_eof()
+        return response
+
+
+async def download(client: AsyncHttpClient, url: str, args: argparse.Namespace, segment_size: int) -> tuple:
+    started = time.perf_counter()
+    resp, mediafile = await client.download(
+        url=url,
+        name="video.mp4",
+        max_size=8 * 1024 * 1024,
+        retries=args.retries,
+        segment_size=segment_size,
+        segments=args.segments
+    )
+    elapsed = time.perf_counter() - started
+
+    data = mediafile.read() if mediafile else b""
+    if mediafile: mediafile.discard()
+    return resp.status_code, data, elapsed
+
+
+async def run(args: argparse.Namespace) -> int:
+    body = os.urandom(int(args.size_mb * 1024 * 1024))
+    segment_size = int(args.segment_mb * 1024 * 1024)
+    server = RangeServer(body, args.mbps, cut_after=segment_size // 2)
+
+    runner = web.AppRunner(server.app())
+    await runner.setup()
+    await web.TCPSite(runner, host="127.0.0.1", port=args.port).start()
+
+    client = AsyncHttpClient(limit_per_host=args.segments + 1)
+    base = f"http://127.0.0.1:{args.port}"
+    failed = False
+
+    try:
+        cases = [
+            ("single stream", "video", 0),
+            (f"{args.segments} ranges", "video", segment_size),
+            ("no range support", "plain", segment_size),
+            ("ranges cut mid-body", "flaky", segment_size),
+        ]
+        single = None
+        for label, name, size in cases:
+            server.requests = 0
+            status, data, elapsed = await download(client, f"{base}/{name}.mp4", args, size)
+
+            ok = status == 200 and data == body
+            failed |= not ok
+            single = single or elapsed
+            print(
+                f"{label:20}: {elapsed:6.2f}s  {len(body) / elapsed / 125000:7.1f} Mbit/s  "
+                f"x{single / elapsed:4.1f}  {server.requests:3} requests  {'ok' if ok else 'MISMATCH'}"
+            )
+    finally:
+        await client.close()
+        await runner.cleanup()
+
+    return 1 if failed else 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--size-mb", type=float, default=24, help="size of the served video")
+    parser.add_argument("--mbps", type=float, default=40, help="bandwidth of each connection in Mbit/s")
+    parser.add_argument("--segment-mb", type=float, default=4, help="size of each range")
+    parser.add_argument("--segments", type=int, default=4, help="ranges downloaded at once")
+    parser.add_argument("--retries", type=int, default=5, help="retries of a broken range")
+    parser.add_argument("--port", type=int, default=18090)
+    args = parser.parse_args()
+
+    sys.exit(asyncio.run(run(args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""Benchmark feed media extraction.
+
+Compares the single-pass ``extract_records`` + ``select_media`` against the
+per-feature extraction ``__media_url_getter`` used to do, on recorded
+``/api/v1/feed/user/{username}/username/`` pages given as arguments or, by
+default, on the one in ``benchmarks/fixtures``. ``--synthetic`` generates
+pages of the same shape instead.
+
+    python benchmarks/bench_extract.py [page.json ...] [--synthetic 20]
+"""
+import os
+import sys
+import json
+import random
+import timeit
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PyGDBot.media import extract_records, select_media, json_loads
+
+
+FEATURES = ("All Media", "Images", "Videos")
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "instagram_feed_user.json")
+
+
+def synthetic_page(items: int = 33, seed: int = 0) -> bytes:
+    rng = random.Random(seed)
+
+    def versions(kind: str) -> list:
+        return [
+            {"width": w, "height": w, "url": f"https://scontent.cdninstagram.com/v/{rng.getrandbits(64):x}_n.{kind}?oe=65C0FFEE"}
+            for w in (150, 320, 640, 750, 1080)
+        ]
+
+    def media(pk: int) -> dict:
+        node = {"id": f"{pk}_1", "pk": pk, "image_versions2": {"candidates": versions("jpg")}}
+        if rng.random() < 0.4:
+            node["video_versions"] = versions("mp4")[-3:]
+        return node
+
+    feed = []
+    for pk in range(items):
+        item = media(pk)
+        if rng.random() < 0.5:
+            item["carousel_media"] = [media(pk * 100 + child) for child in range(rng.randint(2, 10))]
+        feed.append(item)
+
+    return json.dumps({"items": feed, "next_max_id": "12345678_987654321", "more_available": True}).encode()
+
+
+def legacy(content: bytes, feature: str) -> list:
+    data = json.loads(content.decode("utf-8"))
+    medias = []
+
+    for item in data.get("items", []):
+        match feature:
+            case "All Media":
+                if item.get("carousel_media"):
+                    medias.extend(
+                        max(i.get("image_versions2", {}).get("candidates", []), key=lambda x: x.get("width", 0) * x.get("height", 0)).get("url")
+                        for i in item.get("carousel_media", [])
+                        if i.get("video_versions", None) == None
+                    )
+                elif item.get("video_versions", None) == None:
+                    medias.append(max(item.get("image_versions2", {}).get("candidates", []), key=lambda x: x.get("width", 0) * x.get("height", 0)).get("url"))
+
+                medias.extend(
+                    max(i.get("video_versions", []), key=lambda x: x.get("width", 0) * x.get("height", 0)).get("url")
+                    for i in item.get("carousel_media", [item])
+                    if i.get("video_versions")
+                )
+
+            case "Images":
+                if item.get("carousel_media"):
+                    medias.extend(
+                        max(i.get("image_versions2", {}).get("candidates", []), key=lambda x: x.get("width", 0) * x.get("height", 0)).get("url")
+                        for i in item.get("carousel_media", [])
+                        if i.get("video_versions", None) == None
+                    )
+                elif item.get("video_versions", None) == None:
+                    medias.append(max(item.get("image_versions2", {}).get("candidates", []), key=lambda x: x.get("width", 0) * x.get("height", 0)).get("url"))
+
+            case "Videos":
+                medias.extend(
+                    max(i.get("video_versions", []), key=lambda x: x.get("width", 0) * x.get("height", 0)).get("url")
+                    for i in item.get("carousel_media", [item])
+                    if i.get("video_versions")
+                )
+
+    return medias
+
+
+def single_pass(content: bytes) -> dict:
+    records = extract_records(json_loads(content).get("items", []))
+    return {feature: [record.url for record in select_media(records, feature)] for feature in FEATURES}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("pages", nargs="*", help="recorded feed pages, the fixture by default")
+    parser.add_argument("--synthetic", type=int, default=0, help="generate this many pages instead")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        pages = [synthetic_page(items=33, seed=seed) for seed in range(args.synthetic)]
+    else:
+        pages = [open(path, "rb").read() for path in args.pages or [FIXTURE]]
+
+    for page in pages:
+        selected = single_pass(page)
+        for feature in FEATURES:
+            assert sorted(selected[feature]) == sorted(legacy(page, feature)), feature
+
+    number = 20
+    old = timeit.timeit(lambda: [legacy(page, feature) for page in pages for feature in FEATURES], number=number)
+    new = timeit.timeit(lambda: [single_pass(page) for page in pages], number=number)
+
+    print(f"pages             : {len(pages)} ({sum(map(len, pages)) / 1024:.0f} KiB)")
+    print(f"json decoder      : {json_loads.__module__}")
+    print(f"legacy (3 passes) : {old / number * 1000:.2f} ms")
+    print(f"single pass       : {new / number * 1000:.2f} ms")
+    print(f"speedup           : {old / new:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""Benchmark link page extraction.
+
+Compares ``HtmlParser.attr_parser`` against the ``pyq_parser`` and
+``bs4_parser`` paths on saved igdownloader.app ``ajaxSearch`` responses given
+as arguments or, by default, on the one in ``benchmarks/fixtures``.
+
+    python benchmarks/bench_html.py [response.json ...]
+"""
+import os
+import sys
+import json
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PyGDBot.html_parser import HtmlParser
+
+
+FIXTURE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "igdownloader_ajaxsearch.json")
+SELECTOR = 'ul[class="download-box"] li div[class="download-items"] div[class="download-items__btn"]'
+
+
+def pyquery_hrefs(html: str) -> list:
+    return [HtmlParser.pyq_parser(div, "a").attr("href") for div in HtmlParser.pyq_parser(html, SELECTOR)]
+
+
+def bs4_hrefs(html: str) -> list:
+    return [a.get("href") for a in HtmlParser.bs4_parser(html, f"{SELECTOR} a")]
+
+
+def lxml_hrefs(html: str) -> list:
+    return HtmlParser.attr_parser(html, f"{SELECTOR} a", "href")
+
+
+def main() -> None:
+    pages = [json.load(open(path)).get("data", "") for path in sys.argv[1:] or [FIXTURE]]
+
+    for html in pages:
+        expected = pyquery_hrefs(html)
+        assert expected, "no media found, is the selector still right ?"
+        assert bs4_hrefs(html) == expected
+        assert lxml_hrefs(html) == expected
+
+    number = 200
+    results = {
+        name: timeit.timeit(lambda: [extract(html) for html in pages], number=number)
+        for name, extract in (("pyq_parser", pyquery_hrefs), ("bs4_parser", bs4_hrefs), ("attr_parser", lxml_hrefs))
+    }
+
+    print(f"pages       : {len(pages)} ({sum(map(len, pages)) / 1024:.0f} KiB)")
+    for name, elapsed in results.items():
+        print(f"{name:<12}: {elapsed / number * 1000:.3f} ms ({results['pyq_parser'] / elapsed:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
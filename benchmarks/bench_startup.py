@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+"""Benchmark the cold start of the bot.
+
+Every run is a fresh interpreter, as for a restarted or autoscaled worker, and
+times importing ``PyGDBot.igdownloader`` and then constructing
+``PyGDTelebot``. The medians are checked against ``--budget-ms``, and the
+modules that cost the most to import are listed from ``-X importtime``.
+
+    python benchmarks/bench_startup.py --runs 10 --budget-ms 330
+"""
+import os
+import sys
+import json
+import argparse
+import statistics
+import subprocess
+import tempfile
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = """
+import sys, json, time
+sys.path.insert(0, {root!r})
+started = time.perf_counter()
+from PyGDBot.igdownloader import PyGDTelebot
+imported = time.perf_counter()
+PyGDTelebot()
+constructed = time.perf_counter()
+print(json.dumps({{"import": imported - started, "construct": constructed - imported}}))
+"""
+
+
+def environment() -> dict:
+    env = dict(os.environ)
+    env.update({
+        "TELEBOT_TOKEN": "123456:startup",
+        "IG_COOKIE": "csrftoken=startup; sessionid=startup",
+        "LOG_CFG": os.path.join(ROOT, "logging.yaml"),
+    })
+    for name in ("JOB_QUEUE_DB", "TELEGRAM_API_URL", "METRICS_PORT", "MEDIA_CACHE_DIR"):
+        env.pop(name, None)
+    return env
+
+
+def run_once(workdir: str) -> dict:
+    output = subprocess.run(
+        [sys.executable, "-c", PROBE.format(root=ROOT)],
+        cwd=workdir, env=environment(), capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def slowest_imports(workdir: str, count: int) -> list:
+    """Direct imports of ``PyGDBot.igdownloader`` by cumulative import time, in microseconds."""
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import sys; sys.path.insert(0, {ROOT!r}); import PyGDBot.igdownloader"],
+        cwd=workdir, env=environment(), capture_output=True, text=True, check=True
+    ).stderr
+
+    modules = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line: continue
+
+        _, cumulative, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip()) - 1) // 2
+        if depth == 0 and name.strip() != "PyGDBot.igdownloader":
+            modules = []
+        elif depth == 1:
+            modules.append((int(cumulative), name.strip()))
+
+    return sorted(modules, reverse=True)[:count]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--budget-ms", type=float, default=330, help="fail when import + construction takes longer")
+    parser.add_argument("--top", type=int, default=10, help="number of slowest imports listed")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        run_once(workdir)
+        runs = [run_once(workdir) for _ in range(args.runs)]
+        modules = slowest_imports(workdir, args.top)
+
+    imported = statistics.median(run["import"] for run in runs) * 1000
+    constructed = statistics.median(run["construct"] for run in runs) * 1000
+    total = statistics.median(run["import"] + run["construct"] for run in runs) * 1000
+
+    print(f"import PyGDBot.igdownloader : {imported:7.1f} ms (median of {args.runs})")
+    print(f"PyGDTelebot()               : {constructed:7.1f} ms")
+    print(f"cold start                  : {total:7.1f} ms, budget {args.budget_ms:.0f} ms")
+    print("\nslowest imports (cumulative) :")
+    for cumulative, name in modules:
+        print(f"  {cumulative / 1000:7.1f} ms  {name}")
+
+    if total > args.budget_ms:
+        print(f"FAIL : cold start is over the {args.budget_ms:.0f} ms budget", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
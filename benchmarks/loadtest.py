@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""Offline load test of the whole bot against local stand-ins.
+
+One aiohttp server plays three upstreams:
+
+- the Instagram feed API, serving synthetic pages (or recorded pages given
+  with ``--pages-dir``) chained through ``next_max_id``,
+- the CDN, serving jpg/mp4 bodies with a configurable latency and bandwidth,
+- the Telegram Bot API, answering every method and recording media sends.
+
+``PyGDTelebot`` runs in webhook mode in the same process, pointed at the stub
+through ``IG_BASE_URL`` and telebot's ``API_URL``. Every simulated chat picks
+"All Media" and asks for a profile, and the run reports media/sec, job latency
+percentiles and peak RSS. ``--min-rate`` turns it into a regression check.
+
+    python benchmarks/loadtest.py --chats 50 --pages 3 --cdn-latency 50 --cdn-mbps 20
+"""
+import os
+import re
+import sys
+import json
+import time
+import asyncio
+import logging
+import argparse
+import resource
+import tempfile
+import itertools
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from urllib.parse import parse_qsl
+from aiohttp import web, ClientSession
+
+
+TOKEN = "123456:loadtest"
+SECRET = "loadtest"
+CHUNK_SIZE = 64 * 1024
+CDN_HOST = re.compile(r'https?://[^/"]*(?:cdninstagram|fbcdn)[^/"]*/')
+
+
+def percentile(values: list, q: float) -> float:
+    if not values: return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, round(q * (len(values) - 1)))]
+
+
+class Stub:
+    """Feed API, CDN and Bot API stand-ins, recording what the bot sends."""
+
+    def __init__(self, args: argparse.Namespace) -> None:
+        self.args = args
+        self.base = f"http://127.0.0.1:{args.stub_port}"
+        self.recorded = [
+            open(os.path.join(args.pages_dir, name)).read()
+            for name in sorted(os.listdir(args.pages_dir)) if name.endswith(".json")
+        ] if args.pages_dir else []
+        self.message_ids = itertools.count(1)
+        self.file_ids = itertools.count(1)
+        self.prompted = set()
+        self.started = dict()
+        self.first_media = dict()
+        self.done = dict()
+        self.media = 0
+        self.failed = 0
+        self.calls = dict()
+        self.finished = asyncio.Event()
+
+    def app(self) -> web.Application:
+        app = web.Application(client_max_size=1024 ** 3)
+        app.router.add_get("/api/v1/feed/user/{username}/username/", self.feed)
+        app.router.add_get("/cdn/{path:.*}", self.cdn)
+        app.router.add_route("*", "/bot{token}/{method}", self.bot_api)
+        return app
+
+    def page(self, username: str, page: int) -> str:
+        if self.recorded:
+            data = json.loads(CDN_HOST.sub(f"{self.base}/cdn/", self.recorded[page % len(self.recorded)]))
+        else:
+            def media(name: str, video: bool) -> dict:
+                node = {
+                    "id": name,
+                    "image_versions2": {"candidates": [{"width": 1080, "height": 1080, "url": f"{self.base}/cdn/{name}_n.jpg"}]}
+                }
+                if video:
+                    node["video_versions"] = [{"width": 720, "height": 1280, "url": f"{self.base}/cdn/{name}_n.mp4"}]
+                return node
+
+            items = []
+            for i in range(self.args.items):
+                name = f"{username}_{page}_{i}"
+                if i % 4 == 3:
+                    item = media(name, video=False)
+                    item["carousel_media"] = [media(f"{name}_{child}", video=child == 0) for child in range(3)]
+                else:
+                    item = media(name, video=i % 3 == 0)
+                items.append(item)
+            data = {"items": items}
+
+        data["next_max_id"] = f"page_{page + 1}" if page + 1 < self.args.pages else None
+        return json.dumps(data)
+
+    async def feed(self, request: web.Request) -> web.Response:
+        max_id = request.query.get("max_id")
+        page = int(max_id.split("_")[1]) if max_id else 0
+        return web.Response(text=self.page(request.match_info["username"], page), content_type="application/json")
+
+    async def cdn(self, request: web.Request) -> web.StreamResponse:
+        path = request.match_info["path"].split("?")[0]
+        video = path.endswith(".mp4")
+        size = (self.args.video_kb if video else self.args.image_kb) * 1024
+
+        await asyncio.sleep(self.args.cdn_latency / 1000)
+
+        response = web.StreamResponse(headers={"Content-Type": "video/mp4" if video else "image/jpeg"})
+        response.content_length = size
+        await response.prepare(request)
+
+        chunk = b"\0" * CHUNK_SIZE
+        for sent in range(0, size, CHUNK_SIZE):
+            await response.write(chunk[:min(CHUNK_SIZE, size - sent)])
+            if self.args.cdn_mbps:
+                await asyncio.sleep(CHUNK_SIZE / (self.args.cdn_mbps * 125000))
+        await response.write_eof()
+        return response
+
+    def message(self, chat_id: int, **content) -> dict:
+        return {
+            "message_id": next(self.message_ids),
+            "date": int(time.time()),
+            "chat": {"id": chat_id, "type": "private"},
+            **content
+        }
+
+    def sent_media(self, chat_id: int, kind: str) -> dict:
+        file = {"file_id": f"file{next(self.file_ids)}", "file_unique_id": "u", "width": 1, "height": 1}
+        if kind == "video":
+            return self.message(chat_id, video=dict(file, duration=1))
+        if kind == "document":
+            return self.message(chat_id, document={"file_id": file["file_id"], "file_unique_id": "u"})
+        return self.message(chat_id, photo=[file])
+
+    def count_media(self, chat_id: int, count: int) -> None:
+        self.media += count
+        self.first_media.setdefault(chat_id, time.perf_counter())
+
+    async def bot_api(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        # telebot sends calls without files, e.g. albums of cached file_ids, as GET with a form body.
+        data = dict(request.query)
+        if request.method in request.POST_METHODS:
+            data.update(await request.post())
+        elif request.can_read_body:
+            data.update(parse_qsl(await request.text()))
+        chat_id = int(data.get("chat_id", 0) or 0)
+        self.calls[method] = self.calls.get(method, 0) + 1
+
+        match method:
+            case "sendMediaGroup":
+                media = json.loads(data["media"])
+                self.count_media(chat_id, len(media))
+                result = [self.sent_media(chat_id, item["type"]) for item in media]
+            case "sendPhoto" | "sendVideo" | "sendDocument":
+                self.count_media(chat_id, 1)
+                result = self.sent_media(chat_id, method[4:].lower())
+            case "sendMessage" | "editMessageText":
+                text = data.get("text", "")
+                result = self.message(chat_id, text=text)
+
+                if "Failed to send media" in text:
+                    self.failed += 1
+
+                self.prompted.add(chat_id)
+                if "To continue or not" in text and chat_id not in self.done:
+                    self.done[chat_id] = time.perf_counter()
+                    if len(self.done) >= self.args.chats:
+                        self.finished.set()
+            case _:
+                result = True
+
+        return web.json_response({"ok": True, "result": result})
+
+
+def update(update_id: int, chat_id: int, **content) -> dict:
+    user = {"id": chat_id, "is_bot": False, "first_name": "load", "username": f"chat{chat_id}"}
+    message = {"message_id": update_id, "date": int(time.time()), "chat": {"id": chat_id, "type": "private"}, "from": user}
+
+    if "data" in content:
+        return {
+            "update_id": update_id,
+            "callback_query": {"id": str(update_id), "from": user, "chat_instance": "1", "data": content["data"], "message": message}
+        }
+    return {"update_id": update_id, "message": dict(message, text=content["text"])}
+
+
+async def wait_for(condition, timeout: float) -> None:
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline: raise TimeoutError
+        await asyncio.sleep(0.01)
+
+
+async def run(args: argparse.Namespace) -> int:
+    stub = Stub(args)
+    runner = web.AppRunner(stub.app())
+    await runner.setup()
+    await web.TCPSite(runner, host="127.0.0.1", port=args.stub_port).start()
+
+    os.environ.update({
+        "TELEBOT_TOKEN": TOKEN,
+        "IG_COOKIE": "csrftoken=loadtest; sessionid=loadtest",
+        "IG_BASE_URL": stub.base,
+        "WEBHOOK_URL": f"http://127.0.0.1:{args.webhook_port}/webhook",
+        "WEBHOOK_SECRET": SECRET,
+        "WEBHOOK_HOST": "127.0.0.1",
+        "WEBHOOK_PORT": str(args.webhook_port),
+    })
+    if not args.rate_limits:
+        os.environ["RATE_LIMITS"] = ",".join(
+            f"{name}=100000:100000" for name in ("instagram_api", "instagram_cdn", "igdownloader", "telegram")
+        )
+
+    from telebot import asyncio_helper
+    from PyGDBot.igdownloader import PyGDTelebot
+
+    asyncio_helper.API_URL = f"{stub.base}/bot{{0}}/{{1}}"
+    bot = PyGDTelebot()
+    logging.getLogger().setLevel(logging.WARNING)
+
+    server = asyncio.create_task(bot.start_webhook())
+    webhook = f"http://127.0.0.1:{args.webhook_port}/webhook"
+    ids = itertools.count(1)
+    chats = list(range(1, args.chats + 1))
+
+    async with ClientSession(headers={"X-Telegram-Bot-Api-Secret-Token": SECRET}) as client:
+        async def post(body: dict) -> None:
+            async with client.post(webhook, json=body) as resp:
+                resp.raise_for_status()
+
+        await wait_for(lambda: stub.calls.get("setWebhook"), timeout=10)
+
+        await asyncio.gather(*(post(update(next(ids), chat, data="All Media")) for chat in chats))
+        await wait_for(lambda: stub.prompted.issuperset(chats), timeout=30)
+
+        pages = "all" if args.pages > 1 else None
+        started = time.perf_counter()
+        for chat in chats:
+            stub.started[chat] = time.perf_counter()
+            text = f"username = user{chat}" + (f"\npages = {pages}" if pages else "")
+            await post(update(next(ids), chat, text=text))
+
+        try:
+            await asyncio.wait_for(stub.finished.wait(), timeout=args.timeout)
+        except asyncio.TimeoutError:
+            print(f"timed out with {len(stub.done)}/{len(chats)} chats done", file=sys.stderr)
+        elapsed = time.perf_counter() - started
+
+    server.cancel()
+    await asyncio.gather(server, return_exceptions=True)
+    await runner.cleanup()
+
+    latencies = [stub.done[chat] - stub.started[chat] for chat in stub.done]
+    first = [stub.first_media[chat] - stub.started[chat] for chat in stub.first_media]
+    rate = stub.media / elapsed
+
+    print(f"chats               : {len(stub.done)}/{len(chats)} done")
+    print(f"media delivered     : {stub.media} in {elapsed:.2f}s ({rate:.1f} media/s), {stub.failed} failed sends")
+    print(f"Bot API calls       : {json.dumps(stub.calls, sort_keys=True)}")
+    print(f"job latency         : p50 {percentile(latencies, 0.5):.2f}s, p99 {percentile(latencies, 0.99):.2f}s")
+    print(f"first media latency : p50 {percentile(first, 0.5):.2f}s, p99 {percentile(first, 0.99):.2f}s")
+    print(f"peak RSS            : {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f} MiB")
+
+    if len(stub.done) < len(chats) or stub.failed or (args.min_rate and rate < args.min_rate):
+        print(f"FAIL : expected every chat done without failed sends at {args.min_rate} media/s or more", file=sys.stderr)
+        return 1
+    return 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--chats", type=int, default=20, help="simulated chats, one profile each")
+    parser.add_argument("--pages", type=int, default=2, help="feed pages per profile")
+    parser.add_argument("--items", type=int, default=12, help="posts per synthetic page")
+    parser.add_argument("--pages-dir", help="directory of recorded feed pages (*.json) to serve instead")
+    parser.add_argument("--image-kb", type=int, default=200)
+    parser.add_argument("--video-kb", type=int, default=2048)
+    parser.add_argument("--cdn-latency", type=float, default=20, help="CDN time to first byte, in ms")
+    parser.add_argument("--cdn-mbps", type=float, default=0, help="CDN bandwidth per download in Mbit/s, 0 for unlimited")
+    parser.add_argument("--rate-limits", action="store_true", help="keep RATE_LIMITS instead of lifting them")
+    parser.add_argument("--min-rate", type=float, default=0, help="fail below this many media/s")
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--stub-port", type=int, default=18080)
+    parser.add_argument("--webhook-port", type=int, default=18443)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        os.chdir(workdir)
+        sys.exit(asyncio.run(run(args)))
+
+
+if __name__ == "__main__":
+    main()